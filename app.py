@@ -4,24 +4,63 @@ Green Hydrogen Infrastructure Dashboard - FIXED VERSION
 Frontend application with mapping and optimization
 """
 
+# First, so the startup timings cover every import after it
+import startup
+
+import hmac
 import json
 import math
+import os
 import random
-from flask import Flask, render_template, request, jsonify
+import threading
+import time
+from flask import Flask, render_template, request, jsonify, g, has_request_context, stream_with_context
+from werkzeug.http import parse_accept_header
 from datetime import datetime
 import logging
 
+from metrics import (REGISTRY, REQUEST_LATENCY, PHASE_LATENCY, CANDIDATES_CONSIDERED,
+                     FALLBACKS_TAKEN, CACHE_HITS, CACHE_MISSES, span)
+from profiler import PROFILER, ProfilerBusy, MAX_REQUEST_SESSION_SECONDS
+from enrichment import region_key
+from dataset import DatasetManager
+from coalesce import SingleFlight
+from spatial import latitude_gap_km
+from influence import InfluenceField, DEFAULT_RADIUS_KM, DEFAULT_TOLERANCE
+import export
+import planner
+import portfolio
+from siting import DEFAULT_STORAGE_REACH_KM, DEFAULT_MARKET_KM
+
+startup.mark('imports')
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+DATA_FILE = 'realistic_global_hydrogen_infrastructure_data.json'
+
+# The profiling and admin endpoints only exist when an access token is configured
+PROFILER_TOKEN = os.environ.get('HYDROGEN_PROFILER_TOKEN')
+ADMIN_TOKEN = os.environ.get('HYDROGEN_ADMIN_TOKEN')
+
+# Seconds between checks of DATA_FILE for changes; unset disables the watcher
+WATCH_INTERVAL = os.environ.get('HYDROGEN_WATCH_INTERVAL')
+
+def read_dataset_file(path):
+    """Read a dataset JSON file, rejecting anything that is not a dataset"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get('renewable_energy'), list):
+        raise ValueError(f"{path} does not contain a hydrogen infrastructure dataset")
+    return data
+
 # Load the realistic global hydrogen infrastructure data
-def load_hydrogen_data():
+def load_hydrogen_data(path=DATA_FILE):
     try:
-        with open('realistic_global_hydrogen_infrastructure_data.json', 'r') as f:
-            return json.load(f)
+        return read_dataset_file(path)
     except FileNotFoundError:
         # Generate sample data if file doesn't exist
         logger.warning("Realistic data file not found, generating sample data...")
@@ -159,8 +198,36 @@ def generate_sample_realistic_data():
     
     return data
 
-# Global data variable
-HYDROGEN_DATA = load_hydrogen_data()
+# Current dataset version plus its derived indexes; reloads swap it atomically
+DATASETS = DatasetManager(read_dataset_file)
+
+def install_initial_dataset():
+    """Load and serve the dataset at startup.
+
+    Pages and /api/data are served as soon as the data is parsed; the
+    optimizer and stats indexes are built on a background thread, and the
+    first request needing one before it is done builds it itself.
+    """
+    data = load_hydrogen_data()
+    startup.mark('data_load')
+    dataset = DATASETS.install(data, warm=False)
+    threading.Thread(target=dataset.warm, name="dataset-warm", daemon=True).start()
+    startup.mark('dataset_build')
+
+install_initial_dataset()
+
+if WATCH_INTERVAL:
+    DATASETS.watch(DATA_FILE, float(WATCH_INTERVAL))
+
+def set_hydrogen_data(data):
+    """Replace the served dataset and rebuild everything derived from it"""
+    return DATASETS.install(data)
+
+def current_dataset():
+    """Dataset pinned to the current request, so a reload mid-request is never observed"""
+    if has_request_context() and 'dataset' in g:
+        return g.dataset
+    return DATASETS.current
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points using Haversine formula"""
@@ -173,52 +240,243 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
-def optimize_location(user_preferences):
-    """Optimize location based on user preferences - FIXED VERSION"""
-    try:
-        # Extract user preferences
-        preferred_technology = user_preferences.get('technology', 'electrolysis')
-        min_capacity = float(user_preferences.get('min_capacity', 0))
-        max_distance_to_renewable = float(user_preferences.get('max_distance_to_renewable', 100))
-        min_demand_proximity = float(user_preferences.get('min_demand_proximity', 10))
-        budget = float(user_preferences.get('budget', 10000000))
-        selected_region = user_preferences.get('region', 'global')
-        
-        logger.info(f"Optimization parameters: tech={preferred_technology}, min_cap={min_capacity}, region={selected_region}")
-        
-        # Filter renewable energy sites based on technology, capacity, and region
-        suitable_renewables = []
-        for site in HYDROGEN_DATA.get('renewable_energy', []):
-            # Check region if not global
-            if selected_region != 'global' and selected_region != '' and site.get('region', '').lower() != selected_region.lower():
+def candidate_sites(renewable, max_distance_to_renewable):
+    """(lat, lon, distance_to_renewable) for grid points around a renewable site within the max distance"""
+    re_lat = renewable['latitude']
+    re_lon = renewable['longitude']
+    sites = []
+    # Points on a 5x5 grid of 0.5 degree steps around the renewable site
+    for i in range(-2, 3):
+        for j in range(-2, 3):
+            # Ensure coordinates are valid
+            site_lat = max(-85, min(85, re_lat + i * 0.5))
+            site_lon = max(-180, min(180, re_lon + j * 0.5))
+            
+            # The meridian gap is a lower bound, so it rejects without any trig
+            if (max_distance_to_renewable > 1 and
+                    latitude_gap_km(re_lat, site_lat) > max_distance_to_renewable):
                 continue
-                
-            # Check technology (convert to renewable type)
-            renewable_type = preferred_technology.split('_')[0] if '_' in preferred_technology else preferred_technology
-            if renewable_type == 'electrolysis':
-                renewable_type = 'solar'  # Default to solar for electrolysis
             
+            # Check distance to renewable source
+            distance_to_renewable = calculate_distance(re_lat, re_lon, site_lat, site_lon)
+            if distance_to_renewable > max_distance_to_renewable and max_distance_to_renewable > 1:
+                continue
+            sites.append((site_lat, site_lon, distance_to_renewable))
+    return sites
+
+def sites_near_transport(dataset, sites, near_transport_km):
+    """Keep the sites within near_transport_km of a transport route, with the route each is nearest"""
+    if near_transport_km is None or not sites:
+        return sites, [None] * len(sites)
+    nearest = dataset.route_index().nearest_batch([(lat, lon) for lat, lon, _ in sites], near_transport_km)
+    kept = [(site, route) for site, route in zip(sites, nearest) if route is not None]
+    return [site for site, _ in kept], [route for _, route in kept]
+
+def transport_summary(dataset, nearest_route):
+    """Transport fields reported for a site when near_transport_km is set"""
+    index, distance = nearest_route
+    route = dataset.route_index().routes[index]
+    return {
+        "nearest_transport": {
+            "id": route.get('id'),
+            "name": route.get('name'),
+            "mode": route.get('mode'),
+            "distance_km": round(distance, 2)
+        }
+    }
+
+def storage_summary(dataset, storage_access, nearest_storage):
+    """Storage fields reported for a site when the storage term is enabled"""
+    summary = {"storage_access_score": round(storage_access, 4), "nearest_storage": None}
+    if nearest_storage is not None:
+        index, distance = nearest_storage
+        facility = dataset.storage_index.facilities[index]
+        summary["nearest_storage"] = {
+            "id": facility.get('id'),
+            "name": facility.get('name'),
+            "distance_km": round(distance, 2),
+            "working_capacity_tons": facility.get('working_capacity_tons')
+        }
+    return summary
+
+def supply_summary(dataset, balance):
+    """Supply/demand fields reported for a site when the competition term is enabled"""
+    return {
+        "market_saturation": round(balance['saturation'], 4),
+        "supply_demand_balance": {
+            "local_supply_tpd": round(balance['local_supply_tpd'], 2),
+            "local_demand_tpd": round(balance['local_demand_tpd'], 2),
+            "regional_supply_tpd": round(balance['regional_supply_tpd'], 2),
+            "regional_demand_tpd": round(balance['regional_demand_tpd'], 2),
+            "nearest_competitors": [
+                {
+                    "id": dataset.supply_index.producers[index].get('id'),
+                    "name": dataset.supply_index.producers[index].get('name'),
+                    "distance_km": round(distance, 2),
+                    "capacity_tpd": dataset.supply_index.producers[index].get('capacity_tpd'),
+                    "status": dataset.supply_index.producers[index].get('status')
+                }
+                for index, distance in balance['competitors'][:3]
+            ]
+        }
+    }
+
+def renewable_type_for(preferred_technology):
+    """Renewable type a preferred technology draws on"""
+    # Check technology (convert to renewable type)
+    renewable_type = preferred_technology.split('_')[0] if '_' in preferred_technology else preferred_technology
+    if renewable_type == 'electrolysis':
+        renewable_type = 'solar'  # Default to solar for electrolysis
+    return renewable_type
+
+def find_suitable_renewables(preferred_technology, min_capacity, renewable_pool, dataset):
+    """Renewable sites matching the technology and capacity, relaxing the filters if none do"""
+    renewable_type = renewable_type_for(preferred_technology)
+    
+    with span('filter_renewables'):
+        # Filter renewable energy sites based on technology and capacity
+        suitable_renewables = []
+        for site in renewable_pool:
             if (site.get('type', '').lower() == renewable_type.lower() or 
                 renewable_type in ['electrolysis', 'any', '']) or \
                (renewable_type == 'solar' and site.get('type', '').lower() in ['solar', 'photovoltaic']):
                 if site.get('capacity_mw', 0) >= min_capacity:
                     suitable_renewables.append(site)
-        
+    
         logger.info(f"Found {len(suitable_renewables)} suitable renewable sites")
-        
+    
         if not suitable_renewables:
             # Try with more relaxed criteria
+            FALLBACKS_TAKEN.inc(kind='relaxed_filters')
             suitable_renewables = []
-            for site in HYDROGEN_DATA.get('renewable_energy', []):
-                if selected_region != 'global' and selected_region != '' and site.get('region', '').lower() != selected_region.lower():
-                    continue
+            for site in renewable_pool:
                 if site.get('capacity_mw', 0) >= min_capacity:
                     suitable_renewables.append(site)
-            
+        
             if not suitable_renewables:
                 # Last resort: all renewable sites
-                suitable_renewables = HYDROGEN_DATA.get('renewable_energy', [])[:10]  # Take first 10
+                suitable_renewables = dataset.data.get('renewable_energy', [])[:10]  # Take first 10
+                FALLBACKS_TAKEN.inc(kind='first_sites')
                 logger.info("Using fallback: first 10 renewable sites")
+    
+    return suitable_renewables
+
+# Demand centers itemized in an explain=true breakdown
+EXPLAIN_TOP_CONTRIBUTORS = 5
+
+def explanation(best_terms, contributors, total_demand_proximity, demand_count, demand_pool,
+                best_location, runner_up, results_considered):
+    """Why the winning site won: its score terms, top demand centers and the runner-up margin"""
+    top_demand_centers = []
+    for term, index in sorted(contributors, reverse=True):
+        demand = demand_pool[index]
+        top_demand_centers.append({
+            "id": demand.get('id'),
+            "name": demand.get('name'),
+            "distance_km": round(calculate_distance(best_location['latitude'], best_location['longitude'],
+                                                    demand['latitude'], demand['longitude']), 2),
+            "annual_demand_tons": demand.get('annual_demand_tons'),
+            "score_contribution": round(0.5 * term / (demand_count or 1), 4),
+            "share_of_demand_term": round(term / total_demand_proximity, 4) if total_demand_proximity else 0.0
+        })
+    summary = {
+        "score_breakdown": {term: round(value, 4) for term, value in best_terms.items()},
+        "top_demand_centers": top_demand_centers,
+        "candidates_scored": results_considered,
+        "runner_up": None
+    }
+    if runner_up is not None:
+        runner_up_score, latitude, longitude, renewable_source = runner_up
+        summary["runner_up"] = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "renewable_source": renewable_source,
+            "score": round(runner_up_score, 4),
+            "margin": round(sum(best_terms.values()) - runner_up_score, 4)
+        }
+    return summary
+
+def search_space(dataset, selected_region_key):
+    """Renewable pool and demand field a single-site optimization searches"""
+    # Regional queries read straight from the load-time region index
+    if selected_region_key:
+        renewable_pool = dataset.region_index.get('renewable_energy', {}).get(selected_region_key, [])
+    else:
+        renewable_pool = dataset.data.get('renewable_energy', [])
+    return renewable_pool, dataset.demand_fields.get(selected_region_key) or InfluenceField([], [])
+
+# Indexes every single-site plan reads, and those each optional scoring term adds
+PLAN_INDEXES = ('demand_fields', 'stats')
+OPTION_INDEXES = {'storage': 'storage_index', 'competition': 'supply_index', 'near_transport': 'route_index'}
+
+def scoring_options(user_preferences):
+    """Optional scoring terms a single-site request enables, named as in planner.OPTION_TERMS"""
+    options = []
+    if float(user_preferences.get('storage_weight', 0)) > 0:
+        options.append('storage')
+    if float(user_preferences.get('competition_weight', 0)) > 0:
+        options.append('competition')
+    if user_preferences.get('near_transport_km') not in (None, ''):
+        options.append('near_transport')
+    if str(user_preferences.get('explain', '')).lower() in ('true', '1', 'yes'):
+        options.append('explain')
+    return options
+
+def indexes_built(dataset, options):
+    """Whether planning and optimizing with these options would build no index on the way"""
+    needed = list(PLAN_INDEXES) + [OPTION_INDEXES[option] for option in options if option in OPTION_INDEXES]
+    return all(dataset.built(name) for name in needed)
+
+def plan_optimization(user_preferences, dataset):
+    """Cost-based plan for a single-site optimization, made before any candidate is scored"""
+    options = scoring_options(user_preferences)
+    built = indexes_built(dataset, options)
+    renewable_pool, demand_field = search_space(dataset, region_key(user_preferences.get('region', 'global')))
+    # Demand centers beyond this radius may be summed in aggregate, within the tolerance;
+    # unless the request sets either, the planner decides
+    requested = 'demand_radius_km' in user_preferences or 'demand_tolerance' in user_preferences
+    demand_radius_km = user_preferences.get('demand_radius_km', DEFAULT_RADIUS_KM)
+    demand_radius_km = None if demand_radius_km is None else float(demand_radius_km)
+    return planner.plan(
+        dataset.stats['categories'].get('renewable_energy', {}), renewable_pool, demand_field,
+        renewable_type_for(user_preferences.get('technology', 'electrolysis')),
+        float(user_preferences.get('min_capacity', 0)),
+        float(user_preferences.get('max_distance_to_renewable', 100)),
+        demand_radius_km, float(user_preferences.get('demand_tolerance', DEFAULT_TOLERANCE)), requested,
+        options, built)
+
+def optimize_location(user_preferences, dataset=None, plan=None, execution='inline'):
+    """Optimize location based on user preferences - FIXED VERSION"""
+    dataset = dataset or current_dataset()
+    try:
+        start = time.perf_counter()
+        plan = plan or plan_optimization(user_preferences, dataset)
+        # Extract user preferences
+        preferred_technology = user_preferences.get('technology', 'electrolysis')
+        min_capacity = float(user_preferences.get('min_capacity', 0))
+        max_distance_to_renewable = float(user_preferences.get('max_distance_to_renewable', 100))
+        min_demand_proximity = float(user_preferences.get('min_demand_proximity', 10))
+        budget = float(user_preferences.get('budget', 10000000))
+        selected_region = user_preferences.get('region', 'global')
+        demand_radius_km, demand_tolerance = plan.demand_radius_km, plan.demand_tolerance
+        # Optional reward for operational storage with spare working capacity nearby
+        storage_weight = float(user_preferences.get('storage_weight', 0))
+        storage_reach_km = float(user_preferences.get('storage_reach_km', DEFAULT_STORAGE_REACH_KM))
+        # Optional penalty for sites whose nearby demand existing production already covers
+        competition_weight = float(user_preferences.get('competition_weight', 0))
+        market_km = float(user_preferences.get('market_km', DEFAULT_MARKET_KM))
+        # Optional requirement that sites lie within this distance of a transport route
+        near_transport_km = user_preferences.get('near_transport_km')
+        near_transport_km = None if near_transport_km in (None, '') else float(near_transport_km)
+        # Collect a score breakdown for the winner during the scoring pass
+        explain = str(user_preferences.get('explain', '')).lower() in ('true', '1', 'yes')
+        
+        logger.info(f"Optimization parameters: tech={preferred_technology}, min_cap={min_capacity}, region={selected_region}")
+        
+        selected_region_key = region_key(selected_region)
+        renewable_pool, demand_field = search_space(dataset, selected_region_key)
+        
+        suitable_renewables = find_suitable_renewables(preferred_technology, min_capacity, renewable_pool, dataset)
         
         if not suitable_renewables:
             return {"error": "No suitable renewable energy sites found with given criteria"}
@@ -227,89 +485,130 @@ def optimize_location(user_preferences):
         best_score = -1
         best_location = None
         results_considered = 0
+        # (score, lat, lon, renewable) of the best site that did not win
+        runner_up = None
+        contributors = best_contributors = None
+        best_terms = best_demand_proximity = None
+        loop_start = time.perf_counter()
+        demand_seconds = 0.0
+        # Candidates whose demand was evaluated and the terms and grid cells that took
+        candidates_evaluated = demand_units = 0
         
         # Generate potential locations around suitable renewables
-        for renewable in suitable_renewables[:20]:  # Limit to first 20 to avoid timeout
-            re_lat = renewable['latitude']
-            re_lon = renewable['longitude']
-            
+        for renewable in suitable_renewables[:planner.MAX_RENEWABLES]:  # Limit to first 20 to avoid timeout
             # Generate points around the renewable site
-            for i in range(-2, 3):
-                for j in range(-2, 3):
-                    # Create potential site location
-                    site_lat = re_lat + i * 0.5
-                    site_lon = re_lon + j * 0.5
-                    
-                    # Ensure coordinates are valid
-                    site_lat = max(-85, min(85, site_lat))
-                    site_lon = max(-180, min(180, site_lon))
-                    
-                    # Check distance to renewable source
-                    distance_to_renewable = calculate_distance(
-                        re_lat, re_lon, site_lat, site_lon
-                    )
-                    
-                    if distance_to_renewable > max_distance_to_renewable and max_distance_to_renewable > 1:
-                        continue
-                    
-                    # Calculate proximity to demand centers
-                    total_demand_proximity = 0
-                    demand_count = 0
-                    for demand in HYDROGEN_DATA.get('demand_centers', []):
-                        # Filter by region if specified
-                        if selected_region != 'global' and selected_region != '' and demand.get('region', '').lower() != selected_region.lower():
-                            continue
-                            
-                        distance_to_demand = calculate_distance(
-                            site_lat, site_lon, 
-                            demand['latitude'], demand['longitude']
-                        )
-                        # Weight by demand size - avoid division by zero
-                        if distance_to_demand > 0:
-                            total_demand_proximity += demand['annual_demand_tons'] / (distance_to_demand + 1)
-                        else:
-                            total_demand_proximity += demand['annual_demand_tons']
-                        demand_count += 1
-                    
-                    avg_demand_proximity = total_demand_proximity / (demand_count if demand_count > 0 else 1)
-                    
-                    # Skip if below minimum demand proximity (unless it's very low)
-                    if avg_demand_proximity < min_demand_proximity and min_demand_proximity > 1:
-                        continue
-                    
-                    # Calculate score (higher is better)
-                    score = (
-                        (1 / (distance_to_renewable + 1)) * 0.3 +  # Proximity to renewable
-                        avg_demand_proximity * 0.5 +  # Proximity to demand
-                        (renewable['capacity_mw'] / 10000) * 0.2  # Renewable capacity (normalized)
-                    )
-                    
-                    results_considered += 1
-                    if score > best_score:
-                        best_score = score
-                        best_location = {
-                            "latitude": site_lat,
-                            "longitude": site_lon,
-                            "score": round(score, 4),
-                            "distance_to_renewable_km": round(distance_to_renewable, 2),
-                            "renewable_source": renewable['name'],
-                            "renewable_type": renewable['type'],
-                            "renewable_capacity_mw": renewable['capacity_mw'],
-                            "avg_demand_proximity_score": round(avg_demand_proximity, 2),
-                            "country": renewable.get('country', 'Unknown'),
-                            "region": renewable.get('region', 'Unknown')
+            sites = candidate_sites(renewable, max_distance_to_renewable)
+            sites, routes = sites_near_transport(dataset, sites, near_transport_km)
+            # One index query covers storage access for every site around this renewable
+            storage = (dataset.storage_index.access_batch([(lat, lon) for lat, lon, _ in sites], storage_reach_km)
+                       if storage_weight > 0 else None)
+            market = (dataset.supply_index.balance_batch([(lat, lon) for lat, lon, _ in sites],
+                                                         renewable.get('region'), market_km)
+                      if competition_weight > 0 else None)
+            
+            for position, (site_lat, site_lon, distance_to_renewable) in enumerate(sites):
+                # Calculate proximity to demand centers
+                demand_start = time.perf_counter()
+                if explain:
+                    contributors = []
+                # Weight by demand size: sum of annual_demand_tons / (distance + 1)
+                total_demand_proximity, demand_error, exact_terms, approximated_cells = demand_field.evaluate(
+                    site_lat, site_lon, demand_radius_km, demand_tolerance, contributors, EXPLAIN_TOP_CONTRIBUTORS)
+                candidates_evaluated += 1
+                demand_units += exact_terms + approximated_cells
+                demand_count = len(demand_field)
+                
+                avg_demand_proximity = total_demand_proximity / (demand_count if demand_count > 0 else 1)
+                demand_seconds += time.perf_counter() - demand_start
+                
+                # Skip if below minimum demand proximity (unless it's very low)
+                if avg_demand_proximity < min_demand_proximity and min_demand_proximity > 1:
+                    continue
+                
+                # Calculate score (higher is better)
+                score = (
+                    (1 / (distance_to_renewable + 1)) * 0.3 +  # Proximity to renewable
+                    avg_demand_proximity * 0.5 +  # Proximity to demand
+                    (renewable['capacity_mw'] / 10000) * 0.2  # Renewable capacity (normalized)
+                )
+                if storage is not None:
+                    storage_access, nearest_storage = storage[position]
+                    score += storage_access * storage_weight  # Spare storage within reach
+                if market is not None:
+                    score -= market[position]['saturation'] * competition_weight  # Demand already supplied
+                
+                results_considered += 1
+                if score > best_score:
+                    if best_location is not None:
+                        runner_up = (best_score, best_location['latitude'], best_location['longitude'],
+                                     best_location['renewable_source'])
+                    best_score = score
+                    best_location = {
+                        "latitude": site_lat,
+                        "longitude": site_lon,
+                        "score": round(score, 4),
+                        "distance_to_renewable_km": round(distance_to_renewable, 2),
+                        "renewable_source": renewable['name'],
+                        "renewable_type": renewable['type'],
+                        "renewable_capacity_mw": renewable['capacity_mw'],
+                        "linked_production_facilities": dataset.renewable_links.get(renewable.get('id'), []),
+                        "avg_demand_proximity_score": round(avg_demand_proximity, 2),
+                        # The exact average is within this of avg_demand_proximity_score
+                        "avg_demand_proximity_error_bound": round(
+                            demand_error / (demand_count if demand_count > 0 else 1), 4),
+                        "country": renewable.get('country', 'Unknown'),
+                        "region": renewable.get('region', 'Unknown')
+                    }
+                    if storage is not None:
+                        best_location.update(storage_summary(dataset, storage_access, nearest_storage))
+                    if market is not None:
+                        best_location.update(supply_summary(dataset, market[position]))
+                    if routes[position] is not None:
+                        best_location.update(transport_summary(dataset, routes[position]))
+                    if explain:
+                        best_contributors = contributors
+                        best_demand_proximity = total_demand_proximity
+                        best_terms = {
+                            "renewable_proximity": (1 / (distance_to_renewable + 1)) * 0.3,
+                            "demand_proximity": avg_demand_proximity * 0.5,
+                            "renewable_capacity": (renewable['capacity_mw'] / 10000) * 0.2
                         }
+                        if storage is not None:
+                            best_terms["storage_access"] = storage_access * storage_weight
+                        if market is not None:
+                            best_terms["market_saturation"] = 0.0 - market[position]['saturation'] * competition_weight
+                elif runner_up is None or score > runner_up[0]:
+                    runner_up = (score, site_lat, site_lon, renewable['name'])
+    
+        # Demand scoring is timed per candidate; everything else in the loop is candidate generation
+        loop_seconds = time.perf_counter() - loop_start
+        PHASE_LATENCY.observe(loop_seconds - demand_seconds, phase='candidate_generation')
+        PHASE_LATENCY.observe(demand_seconds, phase='demand_scoring')
+        CANDIDATES_CONSIDERED.inc(candidates_evaluated)
+        plan_report = plan.finish(min(len(suitable_renewables), planner.MAX_RENEWABLES), candidates_evaluated, demand_units,
+                                  (time.perf_counter() - start) * 1000, execution)
         
         logger.info(f"Considered {results_considered} potential locations, best score: {best_score}")
         
         if best_location and best_score > 0:
-            return {
+            result = {
                 "optimal_location": best_location,
-                "message": "Optimal location found based on your criteria"
+                "message": "Optimal location found based on your criteria",
+                "plan": plan_report
             }
+            if explain:
+                if selected_region_key:
+                    demand_pool = dataset.region_index.get('demand_centers', {}).get(selected_region_key, [])
+                else:
+                    demand_pool = dataset.data.get('demand_centers', [])
+                result["explanation"] = explanation(best_terms, best_contributors, best_demand_proximity,
+                                                    len(demand_field), demand_pool, best_location, runner_up,
+                                                    results_considered)
+            return result
         else:
             # Return a fallback location if nothing found
             if suitable_renewables:
+                FALLBACKS_TAKEN.inc(kind='fallback_location')
                 fallback_renewable = suitable_renewables[0]
                 return {
                     "optimal_location": {
@@ -324,7 +623,8 @@ def optimize_location(user_preferences):
                         "country": fallback_renewable.get('country', 'Unknown'),
                         "region": fallback_renewable.get('region', 'Unknown')
                     },
-                    "message": "Fallback location provided - try relaxing your criteria"
+                    "message": "Fallback location provided - try relaxing your criteria",
+                    "plan": plan_report
                 }
             else:
                 return {"error": "No suitable location found with given criteria"}
@@ -333,6 +633,243 @@ def optimize_location(user_preferences):
         logger.error(f"Optimization error: {str(e)}")
         return {"error": f"Optimization failed: {str(e)}"}
 
+def build_portfolio_problem(dataset, selected_region_key, preferred_technology, min_capacity,
+                            max_distance_to_renewable, coverage_km, storage_weight, storage_reach_km,
+                            competition_weight, market_km, near_transport_km):
+    """Candidate sites and their sparse candidate x demand proximity matrix"""
+    if selected_region_key:
+        renewable_pool = dataset.region_index.get('renewable_energy', {}).get(selected_region_key, [])
+        demand_pool = dataset.region_index.get('demand_centers', {}).get(selected_region_key, [])
+    else:
+        renewable_pool = dataset.data.get('renewable_energy', [])
+        demand_pool = dataset.data.get('demand_centers', [])
+    
+    suitable_renewables = find_suitable_renewables(preferred_technology, min_capacity, renewable_pool, dataset)
+    
+    with span('portfolio_matrix'):
+        # Same candidate grid as optimize_location, around every suitable renewable
+        candidates = []
+        for position, renewable in enumerate(suitable_renewables):
+            sites, routes = sites_near_transport(dataset, candidate_sites(renewable, max_distance_to_renewable),
+                                                 near_transport_km)
+            storage = (dataset.storage_index.access_batch([(lat, lon) for lat, lon, _ in sites], storage_reach_km)
+                       if storage_weight > 0 else [(0.0, None)] * len(sites))
+            market = (dataset.supply_index.balance_batch([(lat, lon) for lat, lon, _ in sites],
+                                                         renewable.get('region'), market_km)
+                      if competition_weight > 0 else [None] * len(sites))
+            for (site_lat, site_lon, distance_to_renewable), site_storage, site_market, route in zip(
+                    sites, storage, market, routes):
+                candidates.append((site_lat, site_lon, position, distance_to_renewable,
+                                   site_storage, site_market, route))
+        
+        # Each site earns optimize_location's renewable terms; demand proximity is shared
+        problem = portfolio.PortfolioProblem(
+            candidates=[(lat, lon) for lat, lon, *_ in candidates],
+            groups=[position for _, _, position, *_ in candidates],
+            quality=[(1 / (distance + 1)) * 0.3 + (suitable_renewables[position]['capacity_mw'] / 10000) * 0.2 +
+                     storage_access * storage_weight - (market['saturation'] * competition_weight if market else 0)
+                     for _, _, position, distance, (storage_access, _), market, _ in candidates],
+            demand_points=[(demand['latitude'], demand['longitude']) for demand in demand_pool],
+            demand_tons=[demand.get('annual_demand_tons', 0) for demand in demand_pool],
+            coverage_km=coverage_km,
+            proximity_scale=0.5 / (len(demand_pool) or 1),
+            anchors={position: (renewable['latitude'], renewable['longitude'])
+                     for position, renewable in enumerate(suitable_renewables)},
+            anchor_km=[distance for _, _, _, distance, *_ in candidates]
+        )
+    return suitable_renewables, candidates, problem
+
+def optimize_portfolio(user_preferences, dataset=None):
+    """Choose num_sites locations together, covering as much demand as possible"""
+    dataset = dataset or current_dataset()
+    try:
+        num_sites = int(user_preferences.get('num_sites', 1))
+        if not 1 <= num_sites <= portfolio.MAX_SITES:
+            return {"error": f"num_sites must be between 1 and {portfolio.MAX_SITES}"}
+        capacity_tpd = user_preferences.get('capacity_tpd')
+        capacity_tpd = None if capacity_tpd in (None, '') else float(capacity_tpd)
+        coverage_km = float(user_preferences.get('coverage_km', portfolio.DEFAULT_COVERAGE_KM))
+        time_budget = min(float(user_preferences.get('time_budget_seconds', portfolio.DEFAULT_TIME_BUDGET_SECONDS)),
+                          portfolio.MAX_TIME_BUDGET_SECONDS)
+        preferred_technology = user_preferences.get('technology', 'electrolysis')
+        min_capacity = float(user_preferences.get('min_capacity', 0))
+        max_distance_to_renewable = float(user_preferences.get('max_distance_to_renewable', 100))
+        selected_region_key = region_key(user_preferences.get('region', 'global'))
+        storage_weight = float(user_preferences.get('storage_weight', 0))
+        storage_reach_km = float(user_preferences.get('storage_reach_km', DEFAULT_STORAGE_REACH_KM))
+        competition_weight = float(user_preferences.get('competition_weight', 0))
+        market_km = float(user_preferences.get('market_km', DEFAULT_MARKET_KM))
+        near_transport_km = user_preferences.get('near_transport_km')
+        near_transport_km = None if near_transport_km in (None, '') else float(near_transport_km)
+        
+        logger.info(f"Portfolio parameters: sites={num_sites}, capacity_tpd={capacity_tpd}, coverage_km={coverage_km}")
+        
+        # The candidate x demand matrix only depends on these, so it is reused across
+        # num_sites, capacity and time budget changes
+        matrix_key = (selected_region_key, preferred_technology, min_capacity, max_distance_to_renewable,
+                      coverage_km, storage_weight, storage_reach_km, competition_weight, market_km,
+                      near_transport_km)
+        (suitable_renewables, candidates, problem), cached = dataset.portfolio_problem(
+            matrix_key, lambda: build_portfolio_problem(dataset, *matrix_key))
+        (CACHE_HITS if cached else CACHE_MISSES).inc(cache='portfolio_matrix')
+        
+        if not suitable_renewables:
+            return {"error": "No suitable renewable energy sites found with given criteria"}
+        if not candidates:
+            return {"error": "No candidate sites within the maximum distance to a renewable source"}
+        CANDIDATES_CONSIDERED.inc(len(candidates))
+        
+        with span('portfolio_search'):
+            solution = problem.solve(num_sites, capacity_tpd, time_budget)
+        
+        state = solution['state']
+        placed = len(solution['sites'])
+        shortfall = None
+        message = f"Portfolio of {placed} sites found based on your criteria"
+        if placed < num_sites:
+            shortfall = (f"Only {len(candidates)} candidate sites match your criteria; "
+                         f"relax the region, capacity or distance limits for more")
+            message = f"Portfolio of {placed} of the {num_sites} requested sites found based on your criteria"
+        elif solution['shared_groups']:
+            message += (f"; only {len(suitable_renewables)} renewable sources qualify, "
+                        f"so some host more than one site")
+        sites = []
+        for index in solution['sites']:
+            (site_lat, site_lon, position, distance_to_renewable,
+             (storage_access, nearest_storage), market, route) = candidates[index]
+            renewable = suitable_renewables[position]
+            site = {
+                "latitude": site_lat,
+                "longitude": site_lon,
+                "distance_to_renewable_km": round(distance_to_renewable, 2),
+                "renewable_source": renewable['name'],
+                "renewable_type": renewable['type'],
+                "renewable_capacity_mw": renewable['capacity_mw'],
+                "linked_production_facilities": dataset.renewable_links.get(renewable.get('id'), []),
+                "country": renewable.get('country', 'Unknown'),
+                "region": renewable.get('region', 'Unknown')
+            }
+            site.update(problem.site_summary(state, index, capacity_tpd))
+            if storage_weight > 0:
+                site.update(storage_summary(dataset, storage_access, nearest_storage))
+            if market is not None:
+                site.update(supply_summary(dataset, market))
+            if route is not None:
+                site.update(transport_summary(dataset, route))
+            sites.append(site)
+        
+        logger.info(f"Portfolio of {len(sites)} sites from {len(candidates)} candidates, "
+                    f"score {solution['objective']:.4f} after {solution['swaps']} swaps")
+        
+        return {
+            "sites": sites,
+            "score": round(solution['objective'], 4),
+            "coverage": problem.coverage(state, capacity_tpd),
+            "requested_sites": num_sites,
+            "placed_sites": placed,
+            "shortfall": shortfall,
+            "search": {
+                "candidates": len(candidates),
+                "matrix_entries": problem.matrix_entries,
+                "matrix_seconds": round(problem.build_seconds, 3),
+                "matrix_cached": cached,
+                "greedy_score": round(solution['greedy_objective'], 4),
+                "swaps": solution['swaps'],
+                "seconds": round(solution['seconds'], 3),
+                "time_budget_seconds": time_budget,
+                "stopped_by_time_budget": solution['stopped_by_time_budget'],
+                "shared_renewables": solution['shared_groups']
+            },
+            "message": message
+        }
+    
+    except Exception as e:
+        logger.error(f"Portfolio optimization error: {str(e)}")
+        return {"error": f"Portfolio optimization failed: {str(e)}"}
+
+def cached_json_body(dataset, cache_key, build, cache_name=None):
+    """Serialized JSON body that is built once per dataset version"""
+    cache_name = cache_name or cache_key
+    body = dataset.response_cache.get(cache_key)
+    if body is None:
+        CACHE_MISSES.inc(cache=cache_name)
+        with span('serialization'):
+            body = dataset.response_cache[cache_key] = app.json.dumps(build())
+    else:
+        CACHE_HITS.inc(cache=cache_name)
+    return body
+
+def cached_json_response(cache_key, build, cache_name=None):
+    """Serve a JSON body that only changes when the dataset does"""
+    body = cached_json_body(current_dataset(), cache_key, build, cache_name)
+    return app.response_class(body, mimetype='application/json')
+
+# Identical optimizations running at the same time share one computation
+OPTIMIZE_FLIGHTS = SingleFlight('optimize')
+
+# Preferences read as numbers, so 100 and "100" are the same request
+NUMERIC_PREFERENCES = ('min_capacity', 'max_distance_to_renewable', 'min_demand_proximity', 'budget',
+                       'demand_radius_km', 'demand_tolerance', 'storage_weight', 'storage_reach_km',
+                       'competition_weight', 'market_km', 'near_transport_km', 'target_year', 'num_sites', 'capacity_tpd', 'coverage_km', 'time_budget_seconds')
+
+def optimization_key(user_preferences, dataset):
+    """Coalescing key: requests with equal keys produce the same result"""
+    if not isinstance(user_preferences, dict):
+        return (dataset.version, repr(user_preferences))
+    normalized = dict(user_preferences)
+    for field in NUMERIC_PREFERENCES:
+        if field in normalized:
+            try:
+                normalized[field] = float(normalized[field])
+            except (TypeError, ValueError):
+                pass
+    normalized['region'] = region_key(normalized.get('region'))
+    return (dataset.version, json.dumps(normalized, sort_keys=True, default=str))
+
+def run_optimization(user_preferences, dataset, plan=None, execution='inline'):
+    """Optimize and serialize; this is the unit of work followers share.
+
+    plan, when the caller already made one, must be for the same preferences and dataset;
+    execution is where this call runs ('inline' on the calling thread, or 'worker_pool').
+    """
+    portfolio_mode = isinstance(user_preferences, dict) and 'num_sites' in user_preferences
+    target_year = user_preferences.get('target_year') if isinstance(user_preferences, dict) else None
+    with PROFILER.track_request():
+        try:
+            # A target year optimizes over the projected dataset: facilities online
+            # by then, demand grown to that year
+            if target_year not in (None, ''):
+                target_year = int(float(target_year))
+                with span('projection'):
+                    dataset = dataset.year_dataset(target_year)
+        except ValueError as e:
+            result = {"error": f"Invalid target_year: {e}"}
+        else:
+            if portfolio_mode:
+                result = optimize_portfolio(user_preferences, dataset)
+            else:
+                result = optimize_location(user_preferences, dataset, plan, execution)
+            if target_year not in (None, '') and 'error' not in result:
+                result['target_year'] = target_year
+    logger.debug("Optimization result: %s", result)
+    with span('serialization'):
+        return app.json.dumps(result)
+
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    g.dataset = DATASETS.current
+
+@app.after_request
+def record_request_latency(response):
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+    if 'dataset' in g:
+        response.headers['X-Dataset-Version'] = str(g.dataset.version)
+    return response
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -341,7 +878,110 @@ def index():
 @app.route('/api/data')
 def get_data():
     """API endpoint to get all hydrogen infrastructure data"""
-    return jsonify(HYDROGEN_DATA)
+    return cached_json_response('api_data', lambda: current_dataset().data)
+
+@app.route('/api/data/changes')
+def get_data_changes():
+    """API endpoint for records added, changed or removed since a dataset version"""
+    since = request.args.get('since')
+    if not since:
+        return jsonify({"error": "since must be a dataset version"}), 400
+    
+    dataset = current_dataset()
+    cache_key = f'api_data_changes:{since}'
+    if cache_key not in dataset.response_cache:
+        changes = DATASETS.changes_since(since, dataset)
+        if changes is None:
+            # Too old (or unknown) to patch - the client has to fetch /api/data again
+            return jsonify({"full_reload": True, "to_version": dataset.version})
+    else:
+        changes = None
+    return cached_json_response(cache_key, lambda: changes, cache_name='api_data_changes')
+
+@app.route('/api/projection')
+def get_projection():
+    """API endpoint for active supply, storage and demand per region and year"""
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    selected_region_key = region_key(request.args.get('region', 'global'))
+    dataset = current_dataset()
+    try:
+        projection = dataset.projection()
+        body = cached_json_body(dataset, f'api_projection:{selected_region_key}:{start}:{end}',
+                                lambda: projection.between(start, end, selected_region_key),
+                                cache_name='api_projection')
+    except ValueError as e:
+        return jsonify({"error": f"Invalid start or end: {e}"}), 400
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/routes')
+def get_routes():
+    """API endpoint for transport route polylines at the level of detail for a map zoom"""
+    zoom = request.args.get('zoom', type=int)
+    bbox = request.args.get('bbox')
+    dataset = current_dataset()
+    geometry = dataset.route_geometry()
+    level = geometry.level_for_zoom(zoom)
+    
+    def routes_body(route_indexes):
+        routes = dataset.route_index().routes
+        return {
+            "level": level,
+            "routes": [
+                {
+                    "id": routes[index].get('id'),
+                    "name": routes[index].get('name'),
+                    "mode": routes[index].get('mode'),
+                    "path": geometry.path(index, level)
+                }
+                for index in route_indexes
+            ]
+        }
+    
+    if not bbox:
+        body = cached_json_body(dataset, f'api_routes:{level}',
+                                lambda: routes_body(range(len(dataset.route_index()))),
+                                cache_name='api_routes')
+        return app.response_class(body, mimetype='application/json')
+    try:
+        south, west, north, east = (float(value) for value in bbox.split(','))
+    except ValueError:
+        return jsonify({"error": "bbox must be south,west,north,east in degrees"}), 400
+    return jsonify(routes_body(dataset.route_index().in_box(south, west, north, east)))
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip; an explicit q=0 refuses it even under *"""
+    qualities = {value.lower(): quality for value, quality in parse_accept_header(accept_encoding or '')}
+    return qualities.get('gzip', qualities.get('*', 0)) > 0
+
+def export_headers(category, fmt, compress):
+    """Response headers of a category export"""
+    headers = {"Content-Disposition": f'attachment; filename="{category}.{fmt}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return headers
+
+@app.route('/api/export/<category>.<fmt>')
+def export_category(category, fmt):
+    """Stream one category as GeoJSON or GeoParquet
+
+    ?bbox=south,west,north,east keeps features overlapping the box; any other
+    parameter (region=Europe, status=operational...) filters on that field,
+    and one that is not a field of the category is a 400.
+    Gzipped when the client accepts it.
+    """
+    compress = accepts_gzip(request.headers.get('Accept-Encoding'))
+    try:
+        bbox, where = export.parse_filters(request.args.items(multi=True))
+        chunks = export.export(current_dataset(), category, fmt, bbox, where, compress)
+    except KeyError:
+        return jsonify({"error": f"Unknown export {category}.{fmt}; formats are {', '.join(export.FORMATS)}"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImportError as e:
+        return jsonify({"error": str(e)}), 501
+    return app.response_class(stream_with_context(chunks), mimetype=export.FORMATS[fmt],
+                              headers=export_headers(category, fmt, compress))
 
 @app.route('/api/optimize', methods=['POST'])
 def optimize():
@@ -349,9 +989,10 @@ def optimize():
     try:
         user_preferences = request.json
         logger.info(f"Received optimization request: {user_preferences}")
-        result = optimize_location(user_preferences)
-        logger.info(f"Optimization result: {result}")
-        return jsonify(result)
+        dataset = current_dataset()
+        body, _ = OPTIMIZE_FLIGHTS.do(optimization_key(user_preferences, dataset),
+                                      lambda: run_optimization(user_preferences, dataset))
+        return app.response_class(body, mimetype='application/json')
     except Exception as e:
         logger.error(f"API error: {str(e)}")
         return jsonify({"error": "Optimization request failed"}), 500
@@ -359,33 +1000,115 @@ def optimize():
 @app.route('/api/categories')
 def get_categories():
     """API endpoint to get data categories"""
-    categories = [key for key in HYDROGEN_DATA.keys() if key != 'metadata']
+    categories = [key for key in current_dataset().data.keys() if key != 'metadata']
     return jsonify(categories)
 
 @app.route('/api/regions')
 def get_regions():
     """API endpoint to get available regions"""
-    regions = set()
-    for category in ['renewable_energy', 'hydrogen_production', 'demand_centers']:
-        if category in HYDROGEN_DATA:
-            for item in HYDROGEN_DATA[category]:
-                if 'region' in item:
-                    regions.add(item['region'])
-    return jsonify(sorted(list(regions)))
+    return jsonify(current_dataset().stats['regions'])
+
+@app.route('/api/stats')
+def get_stats():
+    """API endpoint for precomputed dataset statistics"""
+    return cached_json_response('api_stats', lambda: current_dataset().stats)
 
 @app.route('/api/debug/data_info')
 def debug_data_info():
     """Debug endpoint to check data structure"""
+    renewables = current_dataset().stats['categories'].get('renewable_energy', {"count": 0, "categorical": {}, "numeric": {}})
+    
+    def distinct_values(field):
+        summary = renewables['categorical'].get(field, {"values": {}, "missing": renewables['count']})
+        values = list(summary.get('values', {}))
+        if summary['missing']:
+            values.append('Unknown')
+        return values
+    
+    capacity = renewables['numeric'].get('capacity_mw', {"min": 0, "max": 0})
     info = {
-        "total_renewable_sites": len(HYDROGEN_DATA.get('renewable_energy', [])),
-        "regions": list(set(site.get('region', 'Unknown') for site in HYDROGEN_DATA.get('renewable_energy', []))),
-        "technologies": list(set(site.get('type', 'Unknown') for site in HYDROGEN_DATA.get('renewable_energy', []))),
+        "total_renewable_sites": renewables['count'],
+        "regions": distinct_values('region'),
+        "technologies": distinct_values('type'),
         "capacity_range": {
-            "min": min(site.get('capacity_mw', 0) for site in HYDROGEN_DATA.get('renewable_energy', [])) if HYDROGEN_DATA.get('renewable_energy') else 0,
-            "max": max(site.get('capacity_mw', 0) for site in HYDROGEN_DATA.get('renewable_energy', [])) if HYDROGEN_DATA.get('renewable_energy') else 0
+            "min": capacity['min'],
+            "max": capacity['max']
         }
     }
     return jsonify(info)
 
+def check_token(expected, header):
+    """Error response unless the request carries the configured token"""
+    if not expected:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get(header, ''), expected):
+        return jsonify({"error": f"Invalid {header} header"}), 403
+    return None
+
+@app.route('/api/debug/startup')
+def debug_startup():
+    """Debug endpoint with this worker's startup phase timings"""
+    return jsonify(startup.report())
+
+@app.route('/api/debug/profile', methods=['GET', 'POST', 'DELETE'])
+def debug_profile():
+    """Sampling profiler for optimize requests (requires HYDROGEN_PROFILER_TOKEN)
+
+    POST {"requests": N} profiles the next N optimize requests, ending after
+    "timeout_seconds" regardless; POST {"seconds": S} samples every thread for
+    S seconds. DELETE ends a running session early. GET returns the latest
+    profile; add ?format=collapsed for flamegraph-compatible collapsed stacks.
+    """
+    denied = check_token(PROFILER_TOKEN, 'X-Profiler-Token')
+    if denied:
+        return denied
+    
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or {}
+        try:
+            if 'seconds' in options:
+                profile = PROFILER.profile_window(options['seconds'])
+            else:
+                count = PROFILER.profile_requests(options.get('requests', 10),
+                                                  options.get('timeout_seconds', MAX_REQUEST_SESSION_SECONDS))
+                return jsonify({"status": "armed", "requests": count}), 202
+        except ProfilerBusy as e:
+            return jsonify({"error": str(e)}), 409
+        except (TypeError, ValueError):
+            return jsonify({"error": "requests, seconds and timeout_seconds must be numbers"}), 400
+    elif request.method == 'DELETE':
+        if not PROFILER.cancel():
+            return jsonify({"error": "No profiling session is running"}), 404
+        profile = PROFILER.last_profile
+    else:
+        profile = PROFILER.last_profile
+        if PROFILER.active:
+            return jsonify({"status": "running"}), 202
+        if profile is None:
+            return jsonify({"error": "No profile recorded yet"}), 404
+    
+    if request.args.get('format') == 'collapsed':
+        return app.response_class(profile['collapsed'], mimetype='text/plain')
+    return jsonify(profile)
+
+@app.route('/api/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """Rebuild the dataset in the background and swap it in (requires HYDROGEN_ADMIN_TOKEN)"""
+    denied = check_token(ADMIN_TOKEN, 'X-Admin-Token')
+    if denied:
+        return denied
+    
+    status = dict(DATASETS.last_reload, current_version=DATASETS.current.version)
+    if request.method == 'GET':
+        return jsonify(status)
+    if not DATASETS.reload_in_background(DATA_FILE):
+        return jsonify(dict(status, error="A reload is already running")), 409
+    return jsonify({"status": "started", "current_version": DATASETS.current.version}), 202
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+ASGI serving mode for the Green Hydrogen Infrastructure Dashboard
+Serves the dashboard and read endpoints natively on the event loop, runs
+optimizations the planner rates as cheap inline and the rest in a thread
+pool (identical concurrent ones coalesced), streams dataset updates over SSE and
+category exports chunk by chunk, and hands every other route to the Flask app
+
+Run with:  python serve.py   (or: uvicorn asgi:application)
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import app as dashboard
+import export
+from metrics import REQUEST_LATENCY
+
+# Threads available for CPU-bound optimizations in each worker process
+OPTIMIZE_THREADS = int(os.environ.get('HYDROGEN_OPTIMIZE_THREADS', '4'))
+
+# How often an idle /api/events stream checks for a new dataset version and sends a keepalive
+EVENT_POLL_SECONDS = 1.0
+EVENT_KEEPALIVE_SECONDS = 15.0
+
+OPTIMIZE_EXECUTOR = ThreadPoolExecutor(max_workers=OPTIMIZE_THREADS, thread_name_prefix='optimize')
+# Flask fallback routes block, so they get their own pool and never starve optimizations
+WSGI_EXECUTOR = ThreadPoolExecutor(max_workers=OPTIMIZE_THREADS, thread_name_prefix='wsgi')
+
+INDEX_HTML = None
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def send_response(send, status, body, content_type='application/json', headers=None):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    raw_headers = [
+        (b'content-type', content_type.encode('latin-1')),
+        (b'content-length', str(len(body)).encode('latin-1'))
+    ]
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode('latin-1'), str(value).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def version_headers(dataset):
+    return {'X-Dataset-Version': dataset.version}
+
+
+async def index(scope, receive, send, dataset):
+    global INDEX_HTML
+    if INDEX_HTML is None:
+        INDEX_HTML = dashboard.app.jinja_env.get_template('index.html').render()
+    await send_response(send, 200, INDEX_HTML, 'text/html; charset=utf-8')
+
+
+async def off_loop(ready, build):
+    """build() inline when its result is already cached, otherwise in the pool
+    so serializing or indexing a new dataset version never blocks the loop"""
+    if ready:
+        return build()
+    return await asyncio.get_running_loop().run_in_executor(WSGI_EXECUTOR, build)
+
+
+async def get_data(scope, receive, send, dataset):
+    body = await off_loop('api_data' in dataset.response_cache,
+                          lambda: dashboard.cached_json_body(dataset, 'api_data', lambda: dataset.data))
+    await send_response(send, 200, body, headers=version_headers(dataset))
+
+
+async def get_regions(scope, receive, send, dataset):
+    body = await off_loop(dataset.built('stats'), lambda: json.dumps(dataset.stats['regions']))
+    await send_response(send, 200, body, headers=version_headers(dataset))
+
+
+async def get_categories(scope, receive, send, dataset):
+    categories = [key for key in dataset.data.keys() if key != 'metadata']
+    await send_response(send, 200, json.dumps(categories), headers=version_headers(dataset))
+
+
+def plan_for(user_preferences, dataset):
+    """Plan of a single-site optimization that may run on the event loop, or None.
+
+    Planning itself only stays on the loop for plain requests whose indexes
+    are all built; portfolio, target-year and optional-term requests, cold
+    indexes and anything the planner cannot read are planned in the pool.
+    """
+    if not isinstance(user_preferences, dict) or 'num_sites' in user_preferences \
+            or user_preferences.get('target_year') not in (None, ''):
+        return None
+    try:
+        options = dashboard.scoring_options(user_preferences)
+        if options or not dashboard.indexes_built(dataset, options):
+            return None
+        return dashboard.plan_optimization(user_preferences, dataset)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+async def optimize(scope, receive, send, dataset):
+    try:
+        user_preferences = json.loads(await read_body(receive) or b'null')
+        dashboard.logger.info(f"Received optimization request: {user_preferences}")
+        plan = plan_for(user_preferences, dataset)
+        if plan is not None and plan.execution == 'inline':
+            # Cheaper than the hand-off to a pool thread; nothing to coalesce at this size
+            body = dashboard.run_optimization(user_preferences, dataset, plan)
+        else:
+            body, _ = await dashboard.OPTIMIZE_FLIGHTS.do_async(
+                dashboard.optimization_key(user_preferences, dataset),
+                lambda: dashboard.run_optimization(user_preferences, dataset, plan, 'worker_pool'),
+                OPTIMIZE_EXECUTOR)
+        await send_response(send, 200, body, headers=version_headers(dataset))
+    except Exception as e:
+        dashboard.logger.error(f"API error: {str(e)}")
+        await send_response(send, 500, json.dumps({"error": "Optimization request failed"}))
+
+
+def request_header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return ''
+
+
+async def export_category(scope, receive, send, dataset):
+    """Stream a category export, encoding one chunk at a time on the WSGI pool.
+
+    The Flask fallback buffers whole bodies, so only errors are left to it.
+    """
+    category, _, fmt = scope['path'][len(EXPORT_PREFIX):].rpartition('.')
+    compress = dashboard.accepts_gzip(request_header(scope, b'accept-encoding'))
+    try:
+        bbox, where = export.parse_filters(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        chunks = export.export(dataset, category, fmt, bbox, where, compress)
+    except (ValueError, KeyError, ImportError):
+        await flask_fallback(scope, receive, send, dataset)
+        return
+
+    headers = dict(dashboard.export_headers(category, fmt, compress), **version_headers(dataset))
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', export.FORMATS[fmt].encode('latin-1'))]
+                   + [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+    })
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(WSGI_EXECUTOR, next, chunks, None)
+        if chunk is None:
+            break
+        if chunk:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def wait_for_disconnect(receive):
+    """Return once the client goes away, skipping the request messages before it"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def dataset_events(scope, receive, send, dataset):
+    """Server-sent events announcing each new dataset version"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')]
+    })
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    last_version = None
+    last_sent = 0.0
+    try:
+        while True:
+            version = dashboard.DATASETS.current.version
+            if version != last_version:
+                payload = f"event: dataset\ndata: {json.dumps({'version': version})}\n\n"
+                last_version = version
+            elif time.monotonic() - last_sent >= EVENT_KEEPALIVE_SECONDS:
+                payload = ": keepalive\n\n"
+            else:
+                payload = None
+            if payload:
+                await send({'type': 'http.response.body', 'body': payload.encode('utf-8'), 'more_body': True})
+                last_sent = time.monotonic()
+            done, _ = await asyncio.wait({disconnected}, timeout=EVENT_POLL_SECONDS)
+            if done:
+                break
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+
+
+def call_wsgi(environ):
+    """Run the Flask app for one request and collect its response"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    result = dashboard.app.wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+async def flask_fallback(scope, receive, send, dataset):
+    """Serve any other route (debug, admin, profiling...) through the Flask app"""
+    body = await read_body(receive)
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    loop = asyncio.get_running_loop()
+    status, headers, response_body = await loop.run_in_executor(WSGI_EXECUTOR, call_wsgi, environ)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': response_body})
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('GET', '/api/data'): get_data,
+    ('GET', '/api/regions'): get_regions,
+    ('GET', '/api/categories'): get_categories,
+    ('POST', '/api/optimize'): optimize,
+    ('GET', '/api/events'): dataset_events
+}
+
+
+# Exports are routed by prefix: /api/export/<category>.<fmt>
+EXPORT_PREFIX = '/api/export/'
+EXPORT_ENDPOINT = '/api/export/<category>.<fmt>'
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            OPTIMIZE_EXECUTOR.shutdown(wait=False)
+            WSGI_EXECUTOR.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    endpoint = scope['path']
+    if handler is None and scope['method'] == 'GET' and endpoint.startswith(EXPORT_PREFIX):
+        handler, endpoint = export_category, EXPORT_ENDPOINT
+    if handler is None:
+        await flask_fallback(scope, receive, send, None)
+        return
+
+    start = time.perf_counter()
+    # Pin the dataset for the whole request, exactly like the Flask before_request hook
+    dataset = dashboard.DATASETS.current
+    await handler(scope, receive, send, dataset)
+    if handler is not dataset_events:
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=scope['method'])
@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the optimizer, the data loader and the API
+Generates seeded synthetic datasets of increasing size, measures them and
+compares the results against a stored baseline to flag regressions; also
+checks that the fast distance, demand influence and transport route paths
+stay within their error bounds, and that a fresh worker starts within budget
+
+Usage:
+    python benchmarks/run_benchmarks.py                    # compare with baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline  # record a new baseline and its noise
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)  # app.py loads its dataset relative to the working directory
+
+from collect_hydrogen_data import RealisticGlobalHydrogenDataGenerator, DEFAULT_ENTRY_COUNTS
+from spatial import DistanceTable, EARTH_RADIUS_KM, latitude_gap_km, to_unit_vector
+from influence import InfluenceField
+from transport import RouteIndex
+import export
+import app as dashboard
+
+DEFAULT_SCALES = [1, 10, 40]
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, "benchmarks", "results.json")
+
+# Preference sets covering cheap and expensive optimizer paths
+PREFERENCE_MATRIX = {
+    "default": {"technology": "electrolysis"},
+    "wind_high_capacity": {"technology": "wind", "min_capacity": 500},
+    "hydro_regional": {"technology": "hydro", "region": "Europe"},
+    "any_tight_radius": {"technology": "any", "max_distance_to_renewable": 40, "min_demand_proximity": 0},
+    "solar_demand_floor": {"technology": "solar", "min_demand_proximity": 50},
+    "geothermal_budget": {"technology": "geothermal", "budget": 5000000, "min_capacity": 100}
+}
+
+# Multi-site portfolios; the candidate matrix is cached per dataset, so repeats time the search
+PORTFOLIO_MATRIX = {
+    "five_sites": {"technology": "any", "num_sites": 5},
+    "ten_sites_capacity": {"technology": "wind", "num_sites": 10, "capacity_tpd": 100, "time_budget_seconds": 1}
+}
+
+# Error budget for the fast distance paths, checked against calculate_distance
+DISTANCE_TOLERANCE_KM = 1e-6
+
+LOADER_SNIPPET = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import app
+app.current_dataset().warm()  # wait for the startup warm-up so it does not skew the timing
+samples = []
+for _ in range({repeats}):
+    start = time.perf_counter()
+    data = app.load_hydrogen_data({path!r})
+    samples.append((time.perf_counter() - start) * 1000)
+samples.sort()
+# ru_maxrss survives exec on Linux, so it would report the benchmark process
+# itself once that outgrows the loader; VmHWM starts fresh in every process
+peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform.startswith("linux"):
+    with open("/proc/self/status") as f:
+        peak_rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+print(json.dumps({{"median_ms": samples[len(samples) // 2], "min_ms": samples[0], "peak_rss_kb": peak_rss_kb}}))
+"""
+
+# A worker has to answer its first page and data requests within this many
+# milliseconds of being spawned, interpreter startup included
+DEFAULT_COLD_START_BUDGET_MS = 1000.0
+
+# Fresh interpreter: import the app, then serve / and /api/data once each
+COLD_START_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+first_request_ms = {{}}
+for name, url in (("index", "/"), ("api_data", "/api/data")):
+    request_start = time.perf_counter()
+    if client.get(url).status_code != 200:
+        raise SystemExit(f"{{url}} failed")
+    first_request_ms[name] = (time.perf_counter() - request_start) * 1000
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": first_request_ms,
+    "startup": app.startup.report()
+}}))
+"""
+
+# Packages reported in the import-time breakdown
+IMPORT_BREAKDOWN_TOP = 10
+
+# Size of the reference workload timings are scaled by; a few milliseconds
+REFERENCE_ITERATIONS = 20000
+
+
+def generate_dataset(scale: int, seed: int) -> Dict[str, Any]:
+    """Generate a seeded dataset with every category scaled by the given factor"""
+    generator = RealisticGlobalHydrogenDataGenerator(seed=seed)
+    counts = {category: count * scale for category, count in DEFAULT_ENTRY_COUNTS.items()}
+    return generator.generate_complete_dataset(counts)
+
+
+def reference_ms() -> float:
+    """Time a fixed pure-Python workload, to gauge how fast the machine is running right now"""
+    start = time.perf_counter()
+    total, table = 0.0, {}
+    for i in range(REFERENCE_ITERATIONS):
+        x = i * 0.001
+        total += math.sin(x) * math.cos(x) + math.sqrt(x + 1)
+        table[i & 255] = total
+    return (time.perf_counter() - start) * 1000
+
+
+def time_call(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    """Run fn repeatedly and summarise wall-clock latency in milliseconds.
+
+    Each run is paired with a run of the reference workload, so the result
+    carries how fast the machine was while it was measured.
+    """
+    samples, references = [], []
+    for _ in range(repeats):
+        references.append(reference_ms())
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "min_ms": samples[0],
+        "reference_ms": min(references)
+    }
+
+
+def bench_loader(data: Dict[str, Any], repeats: int) -> Dict[str, float]:
+    """Measure load_hydrogen_data time and peak RSS in a fresh interpreter"""
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(data, f, default=str)
+        path = f.name
+    try:
+        reference = reference_ms()
+        output = subprocess.run(
+            [sys.executable, "-c", LOADER_SNIPPET.format(root=REPO_ROOT, path=path, repeats=repeats)],
+            capture_output=True, text=True, check=True, cwd=REPO_ROOT
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["reference_ms"] = min(reference, reference_ms())
+        result["file_mb"] = os.path.getsize(path) / (1024 * 1024)
+        return result
+    finally:
+        os.unlink(path)
+
+
+def import_breakdown(stderr: str) -> Dict[str, float]:
+    """Milliseconds spent importing each top-level package, from python -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            package = name.strip().split(".")[0]
+            totals[package] = totals.get(package, 0) + int(own) / 1000
+    top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:IMPORT_BREAKDOWN_TOP]
+    return {package: round(ms, 2) for package, ms in top}
+
+
+def bench_cold_start(repeats: int, budget_ms: float) -> Dict[str, Any]:
+    """Spawn fresh workers and time them up to their first / and /api/data responses.
+
+    The median wall time, interpreter startup included, must stay within
+    budget_ms, and no heavy optional module may be imported on the way.
+    """
+    command = [sys.executable, "-c", COLD_START_SNIPPET.format(root=REPO_ROOT)]
+    samples, runs = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=REPO_ROOT).stdout
+        samples.append((time.perf_counter() - start) * 1000)
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    profiled = subprocess.run([sys.executable, "-X", "importtime"] + command[1:],
+                              capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    median_run = runs[samples.index(sorted(samples)[len(samples) // 2])]
+    heavy = sorted({name for run in runs for name in run["startup"]["heavy_modules_loaded"]})
+    wall_ms = statistics.median(samples)
+    return {
+        "wall_median_ms": wall_ms,
+        "import_ms": median_run["import_ms"],
+        "first_request_ms": median_run["first_request_ms"],
+        "phases_ms": median_run["startup"]["phases_ms"],
+        "import_breakdown_ms": import_breakdown(profiled.stderr),
+        "heavy_modules_loaded": heavy,
+        "budget_ms": budget_ms,
+        "passed": wall_ms <= budget_ms and not heavy
+    }
+
+
+def bench_optimizer(repeats: int) -> Dict[str, Dict[str, float]]:
+    """Measure optimize_location latency for each preference set"""
+    return {
+        name: time_call(lambda prefs=prefs: dashboard.optimize_location(dict(prefs)), repeats)
+        for name, prefs in PREFERENCE_MATRIX.items()
+    }
+
+
+def check_plans() -> Dict[str, Dict[str, Any]]:
+    """The planner's strategy and its estimated against actual cost for each preference set"""
+    results = {}
+    for name, prefs in PREFERENCE_MATRIX.items():
+        plan = dashboard.optimize_location(dict(prefs)).get("plan")
+        if plan is None:
+            continue
+        results[name] = {
+            "strategy": plan["strategy"],
+            "execution": plan["planned_execution"],
+            "estimated_candidates": plan["estimated"]["candidates"],
+            "actual_candidates": plan["actual"]["candidates"],
+            "estimated_plan_ms": plan["estimated"]["ms"],
+            "actual_plan_ms": plan["actual"]["ms"]
+        }
+    return results
+
+
+def bench_portfolio(repeats: int) -> Dict[str, Dict[str, float]]:
+    """Measure optimize_portfolio latency for each portfolio preference set"""
+    return {
+        name: time_call(lambda prefs=prefs: dashboard.optimize_portfolio(dict(prefs)), repeats)
+        for name, prefs in PORTFOLIO_MATRIX.items()
+    }
+
+
+def bench_api(requests_per_endpoint: int) -> Dict[str, Dict[str, float]]:
+    """Measure endpoint latency and throughput through the Flask test client"""
+    client = dashboard.app.test_client()
+    calls = {
+        "api_data": lambda: client.get('/api/data'),
+        "api_regions": lambda: client.get('/api/regions'),
+        "api_optimize": lambda: client.post('/api/optimize', json=PREFERENCE_MATRIX["default"])
+    }
+    results = {}
+    for name, call in calls.items():
+        response = call()  # Warm up and make sure the endpoint works at all
+        if response.status_code != 200:
+            raise RuntimeError(f"{name} returned HTTP {response.status_code}")
+        results[name] = time_call(call, requests_per_endpoint)
+        results[name]["requests_per_second"] = 1000 / results[name]["median_ms"]
+    return results
+
+
+def bench_export(repeats: int) -> Dict[str, Dict[str, float]]:
+    """Measure streaming exports of every category, and the most memory any one holds at once"""
+    dataset = dashboard.current_dataset()
+    formats = ["geojson"]
+    try:
+        export.optional_import("pyarrow", "GeoParquet export")
+        formats.append("parquet")
+    except ImportError:
+        pass
+
+    def run_export(fmt):
+        return sum(len(chunk) for category in export.categories(dataset.data)
+                   for chunk in export.export(dataset, category, fmt))
+
+    results = {}
+    for fmt in formats:
+        results[fmt] = time_call(lambda fmt=fmt: run_export(fmt), repeats)
+        tracemalloc.start()
+        results[fmt]["output_mb"] = run_export(fmt) / (1024 * 1024)
+        results[fmt]["peak_traced_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return results
+
+
+def random_point(rng: random.Random) -> tuple:
+    """Uniform on the sphere, with extra weight on the poles and the antimeridian"""
+    roll = rng.random()
+    if roll < 0.1:
+        return rng.uniform(80, 90) * rng.choice((-1, 1)), rng.uniform(-180, 180)
+    if roll < 0.2:
+        return rng.uniform(-60, 60), rng.uniform(175, 180) * rng.choice((-1, 1))
+    return rng.uniform(-90, 90), rng.uniform(-180, 180)
+
+
+def check_distance_bounds(seed: int, points: int = 2000, queries: int = 300) -> Dict[str, Any]:
+    """Verify the fast distance paths against the exact haversine.
+
+    DistanceTable distances must match calculate_distance to within
+    DISTANCE_TOLERANCE_KM, its radius queries must neither drop nor admit a
+    point (outside that tolerance of the boundary), and latitude_gap_km must
+    never exceed the true distance.
+    """
+    rng = random.Random(seed)
+    sites = [random_point(rng) for _ in range(points)]
+    table = DistanceTable(sites)
+    max_error = 0.0
+    missed = admitted = gap_violations = 0
+    fast_seconds = exact_seconds = 0.0
+    for _ in range(queries):
+        lat, lon = random_point(rng)
+        radius = rng.choice((1, 10, 50, 100, 500, 2000, 10000, 20000)) * rng.uniform(0.5, 1.5)
+
+        start = time.perf_counter()
+        exact = [dashboard.calculate_distance(lat, lon, p_lat, p_lon) for p_lat, p_lon in sites]
+        exact_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        found = dict(table.within(lat, lon, radius))
+        fast_seconds += time.perf_counter() - start
+
+        for distance, fast in zip(exact, table.distances(lat, lon)):
+            max_error = max(max_error, abs(distance - fast))
+        for i, distance in enumerate(exact):
+            if abs(distance - radius) <= DISTANCE_TOLERANCE_KM:
+                continue
+            if distance < radius and i not in found:
+                missed += 1
+            elif distance > radius and i in found:
+                admitted += 1
+            if latitude_gap_km(lat, sites[i][0]) > distance + DISTANCE_TOLERANCE_KM:
+                gap_violations += 1
+
+    return {
+        "max_abs_error_km": max_error,
+        "missed_within_radius": missed,
+        "admitted_outside_radius": admitted,
+        "latitude_gap_violations": gap_violations,
+        "passed": (max_error <= DISTANCE_TOLERANCE_KM and missed == 0 and admitted == 0
+                   and gap_violations == 0),
+        "radius_query_speedup": exact_seconds / fast_seconds if fast_seconds else 0.0
+    }
+
+
+def check_influence_bounds(seed: int, points: int = 3000, queries: int = 200) -> Dict[str, Any]:
+    """Verify that InfluenceField sums stay within their reported error bounds"""
+    rng = random.Random(seed)
+    sites = [random_point(rng) for _ in range(points)]
+    weights = [rng.uniform(1000, 1000000) for _ in sites]
+    field = InfluenceField(sites, weights)
+    table = DistanceTable(sites)
+    violations = 0
+    max_relative_error = max_relative_bound = 0.0
+    for _ in range(queries):
+        lat, lon = random_point(rng)
+        radius = rng.choice((50, 200, 500, 2000))
+        tolerance = rng.choice((0.01, 0.05, 0.2))
+        exact = sum(weight / (distance + 1) for weight, distance in zip(weights, table.distances(lat, lon)))
+        total, bound, _, _ = field.evaluate(lat, lon, radius, tolerance)
+        if abs(total - exact) > bound + exact * 1e-12:
+            violations += 1
+        max_relative_error = max(max_relative_error, abs(total - exact) / exact)
+        max_relative_bound = max(max_relative_bound, bound / exact)
+    return {
+        "bound_violations": violations,
+        "max_relative_error": max_relative_error,
+        "max_relative_bound": max_relative_bound,
+        "passed": violations == 0
+    }
+
+
+def reference_arc_km(lat: float, lon: float, start: tuple, end: tuple) -> float:
+    """Distance from a point to a great-circle arc by maximizing cos(distance) along it.
+
+    Along the arc a*cos(t) + u*sin(t), t in [0, arc length], the cosine of the
+    distance to p is (p.a)cos t + (p.u)sin t, which peaks at t = atan2(p.u, p.a);
+    outside the arc the nearest point is an endpoint.
+    """
+    p, a, b = to_unit_vector(lat, lon), to_unit_vector(*start), to_unit_vector(*end)
+    dot = lambda u, v: u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+    ab = dot(a, b)
+    angle = math.acos(max(-1.0, min(1.0, ab)))
+    candidates = [dot(p, a), dot(p, b)]
+    u = tuple(bi - ab * ai for ai, bi in zip(a, b))
+    norm = math.sqrt(dot(u, u))
+    if norm > 1e-12:
+        u = tuple(x / norm for x in u)
+        pa, pu = dot(p, a), dot(p, u)
+        if 0 <= math.atan2(pu, pa) <= angle:
+            candidates.append(math.hypot(pa, pu))
+    return EARTH_RADIUS_KM * math.acos(max(-1.0, min(1.0, max(candidates))))
+
+
+def check_route_distances(seed: int, routes: int = 300, queries: int = 200) -> Dict[str, Any]:
+    """Verify RouteIndex radius queries against an independent exact point-to-arc distance"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(routes):
+        start = random_point(rng)
+        # Mostly regional routes, some spanning oceans
+        if rng.random() < 0.2:
+            end = random_point(rng)
+        else:
+            end = (max(-89.0, min(89.0, start[0] + rng.uniform(-10, 10))),
+                   (start[1] + rng.uniform(-10, 10) + 180) % 360 - 180)
+        records.append({"id": i, "start_latitude": start[0], "start_longitude": start[1],
+                        "end_latitude": end[0], "end_longitude": end[1]})
+    index = RouteIndex(records)
+    max_error = 0.0
+    missed = admitted = 0
+    for _ in range(queries):
+        lat, lon = random_point(rng)
+        radius = rng.choice((10, 50, 200, 1000))
+        found = dict(index.within(lat, lon, radius))
+        for i, record in enumerate(records):
+            exact = reference_arc_km(lat, lon, (record["start_latitude"], record["start_longitude"]),
+                                     (record["end_latitude"], record["end_longitude"]))
+            if i in found:
+                max_error = max(max_error, abs(found[i] - exact))
+            if abs(exact - radius) <= DISTANCE_TOLERANCE_KM:
+                continue
+            if exact < radius and i not in found:
+                missed += 1
+            elif exact > radius and i in found:
+                admitted += 1
+    return {
+        "max_abs_error_km": max_error,
+        "missed_within_radius": missed,
+        "admitted_outside_radius": admitted,
+        "passed": max_error <= DISTANCE_TOLERANCE_KM and missed == 0 and admitted == 0
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results into dotted metric names"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+# Only the fastest run of each timing is compared, scaled by the reference
+# workload timed alongside it. Scheduling noise only ever adds time, and the
+# machine's own speed drifts between phases up to 1.7x apart, which shifts
+# every timing and the reference alike; unscaled medians of unchanged code
+# swing by 50% or more. Medians, p95 and throughput are reported for context
+COMPARED_METRICS = ("min_ms", "peak_rss_kb")
+
+# Slowdowns smaller than this are timer and allocator jitter, whatever their ratio
+MIN_REGRESSION_MS = 1.0
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("requests_per_second")
+
+
+def metric_changes(current: Dict[str, float], baseline: Dict[str, float]) -> Dict[str, Tuple[float, float]]:
+    """metric -> (value, relative slowdown) for every compared metric, timings adjusted
+    to the machine speed the baseline was recorded at"""
+    changes = {}
+    for metric, value in current.items():
+        if not metric.endswith(COMPARED_METRICS) or metric not in baseline or baseline[metric] <= 0:
+            continue
+        reference = metric.rsplit(".", 1)[0] + ".reference_ms"
+        if metric.endswith("_ms") and current.get(reference, 0) > 0 and baseline.get(reference, 0) > 0:
+            value *= baseline[reference] / current[reference]
+        ratio = value / baseline[metric]
+        changes[metric] = (value, (1 / ratio - 1) if higher_is_better(metric) else (ratio - 1))
+    return changes
+
+
+def measure_noise(first: Dict[str, float], repeats: List[Dict[str, float]]) -> Dict[str, float]:
+    """Largest slowdown of each metric in repeated runs of the same code against the first run"""
+    noise: Dict[str, float] = {}
+    for run_metrics in repeats:
+        for metric, (_, change) in metric_changes(run_metrics, first).items():
+            noise[metric] = round(max(noise.get(metric, 0.0), change), 3)
+    return noise
+
+
+def compare_to_baseline(current: Dict[str, float], baseline: Dict[str, float], threshold: float,
+                        noise: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Return every metric that is worse than the baseline by more than threshold plus the
+    run-to-run noise measured for it when the baseline was recorded"""
+    regressions = []
+    for metric, (value, change) in metric_changes(current, baseline).items():
+        if metric.endswith("_ms") and value - baseline[metric] < MIN_REGRESSION_MS:
+            continue
+        allowed = threshold + (noise or {}).get(metric, 0.0)
+        if change > allowed:
+            regressions.append({
+                "metric": metric,
+                "baseline": baseline[metric],
+                "current": value,
+                "change_percent": round(change * 100, 1),
+                "allowed_percent": round(allowed * 100, 1)
+            })
+    return regressions
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results = {
+        "metadata": {
+            "created_date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "seed": args.seed,
+            "scales": args.scales
+        },
+        "scales": {},
+        "distance_checks": check_distance_bounds(args.seed),
+        "influence_checks": check_influence_bounds(args.seed),
+        "route_checks": check_route_distances(args.seed),
+        "cold_start": bench_cold_start(args.cold_starts, args.cold_start_budget_ms)
+    }
+    for scale in args.scales:
+        print(f"Benchmarking scale x{scale}...")
+        results["scales"][f"x{scale}"] = bench_scale(scale, args)
+    return results
+
+
+def bench_scale(scale: int, args: argparse.Namespace) -> Dict[str, Any]:
+    data = generate_dataset(scale, args.seed)
+    dashboard.set_hydrogen_data(data)
+    return {
+        "records": sum(len(v) for k, v in data.items() if k != "metadata"),
+        "loader": bench_loader(data, args.repeats),
+        "optimizer": bench_optimizer(args.repeats),
+        "plans": check_plans(),
+        "portfolio": bench_portfolio(args.repeats),
+        "api": bench_api(args.requests),
+        "export": bench_export(args.repeats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hydrogen dashboard")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="dataset size multipliers over the default entry counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=5, help="optimizer runs per preference set")
+    parser.add_argument("--requests", type=int, default=20, help="API requests per endpoint")
+    parser.add_argument("--cold-starts", type=int, default=5, help="fresh workers spawned to time cold start")
+    parser.add_argument("--cold-start-budget-ms", type=float, default=DEFAULT_COLD_START_BUDGET_MS,
+                        help="median time a fresh worker may take to serve / and /api/data")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="relative slowdown that counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--baseline-runs", type=int, default=3,
+                        help="runs recorded with --update-baseline to measure run-to-run noise")
+    args = parser.parse_args()
+
+    # Benchmarks should measure work, not log formatting
+    logging.disable(logging.INFO)
+
+    results = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    for name in ("distance_checks", "influence_checks", "route_checks"):
+        if not results[name]["passed"]:
+            print(f"Error bounds violated in {name}: {results[name]}")
+            return 1
+
+    cold_start = results["cold_start"]
+    if not cold_start["passed"]:
+        print(f"Cold start over budget: {cold_start['wall_median_ms']:.1f} ms "
+              f"(budget {cold_start['budget_ms']:.0f} ms), heavy modules loaded: "
+              f"{cold_start['heavy_modules_loaded'] or 'none'}")
+        print(f"Slowest imports (ms): {cold_start['import_breakdown_ms']}")
+        return 1
+
+    if args.update_baseline:
+        # Unchanged code has to pass the gate: rerun the scales and widen each
+        # metric's threshold by how far the reruns drifted from the recorded run
+        repeats = []
+        for number in range(2, args.baseline_runs + 1):
+            print(f"Noise run {number} of {args.baseline_runs}...")
+            repeats.append(flatten({f"x{scale}": bench_scale(scale, args) for scale in args.scales}))
+        results["noise"] = measure_noise(flatten(results["scales"]), repeats)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated at {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found - run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(flatten(results["scales"]), flatten(baseline["scales"]), args.threshold,
+                                      baseline.get("noise"))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%} plus measured noise:")
+        for item in regressions:
+            print(f"  {item['metric']}: {item['baseline']:.3f} -> {item['current']:.3f} "
+                  f"({item['change_percent']:+.1f}%, allowed {item['allowed_percent']:.1f}%, "
+                  f"adjusted for machine speed)")
+        return 1
+
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
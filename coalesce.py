@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Single-flight request coalescing
+Concurrent calls with the same key share one in-progress computation; the
+first caller (the leader) runs it and every follower waits for its result
+"""
+
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Tuple
+
+from metrics import COALESCED_REQUESTS
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+class _Flight:
+    """One in-progress computation and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """De-duplicates identical concurrent work.
+
+    Nothing is cached: once a computation finishes its key is forgotten, so
+    the next call starts a fresh one. Exceptions are shared like results.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        # Event-loop callers share futures instead of blocking a thread while they wait
+        self._async_flights: Dict[Hashable, "asyncio.Future"] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn, or wait for the identical call already running.
+
+        Returns (result, shared) where shared is True for followers.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        COALESCED_REQUESTS.inc(flight=self.name, role="leader" if leader else "follower")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Any], executor=None) -> Tuple[Any, bool]:
+        """Event-loop version of do(); the leader runs fn in executor"""
+        # Imported here so WSGI workers, which never get this far, skip loading asyncio
+        import asyncio
+        future = self._async_flights.get(key)
+        if future is not None:
+            COALESCED_REQUESTS.inc(flight=self.name, role="follower")
+            # shield: a follower disconnecting must not cancel everyone else's result
+            return await asyncio.shield(future), True
+
+        COALESCED_REQUESTS.inc(flight=self.name, role="leader")
+        loop = asyncio.get_running_loop()
+        future = self._async_flights[key] = asyncio.ensure_future(loop.run_in_executor(executor, fn))
+        future.add_done_callback(lambda _: self._async_flights.pop(key, None))
+        return await asyncio.shield(future), False
@@ -2,23 +2,44 @@
 """
 Complete Python script to generate realistic global hydrogen infrastructure data
 Creates 50+ entries per category with realistic locations on land
+
+Usage:
+    python collect_hydrogen_data.py                                  # generate the dataset
+    python collect_hydrogen_data.py export renewable_energy --format parquet --bbox 35,-10,60,30
 """
 
+import argparse
 import json
+import os
 import random
 import math
+import sys
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 import logging
 
+from spatial import SphericalKDTree, haversine_km
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+DEFAULT_ENTRY_COUNTS = {
+    "renewable_energy": 65,
+    "hydrogen_production": 60,
+    "storage_facilities": 55,
+    "transport_infrastructure": 62,
+    "demand_centers": 58,
+    "environmental_constraints": 53,
+    "economic_data": 57
+}
+
 class RealisticGlobalHydrogenDataGenerator:
-    def __init__(self):
+    def __init__(self, seed: int = None):
+        if seed is not None:
+            random.seed(seed)
         self.data = {
             "metadata": {
                 "created_date": datetime.now().isoformat(),
@@ -267,11 +288,6 @@ class RealisticGlobalHydrogenDataGenerator:
             country_data = random.choice(countries_data)
             lat, lon = self.generate_coordinates_for_country(country_data["key"])
             
-            # Find nearby renewable source for electrolysis facilities
-            nearby_renewable = ""
-            if tech["tech"] == "electrolysis":
-                nearby_renewable = f"re_{random.randint(1, 65):03d}"
-            
             entry = {
                 "id": f"hp_{i+1:03d}",
                 "name": f"{country_data['name']} H2 Production Facility {chr(65 + i%26)}",
@@ -290,7 +306,7 @@ class RealisticGlobalHydrogenDataGenerator:
                     "ITM Power", "Plug Power", "McPhy", "Nel Hydrogen", "Cummins",
                     "Bloom Energy", "Hydrogenics", "Ballard Power", "Toyota", "Hyundai"
                 ]),
-                "nearby_renewable_source": nearby_renewable,
+                "nearby_renewable_source": "",  # Filled in by link_nearby_renewables()
                 "carbon_intensity_kg_co2_per_kg_h2": round(
                     0 if tech["tech"] == "electrolysis" else random.uniform(8, 12), 3
                 ),
@@ -647,18 +663,65 @@ class RealisticGlobalHydrogenDataGenerator:
         
         return economic_data
     
-    def generate_complete_dataset(self) -> Dict[str, Any]:
+    def link_nearby_renewables(self) -> None:
+        """Point every production facility at its nearest renewable site"""
+        renewables = self.data["renewable_energy"]
+        if not renewables:
+            return
+        
+        index = SphericalKDTree([(site["latitude"], site["longitude"]) for site in renewables])
+        for facility in self.data["hydrogen_production"]:
+            nearest, distance = index.nearest(facility["latitude"], facility["longitude"])
+            facility["nearby_renewable_source"] = renewables[nearest]["id"]
+            facility["nearby_renewable_distance_km"] = round(distance, 2)
+    
+    def link_transport_endpoints(self) -> None:
+        """Snap transport route ends onto the nearest real facilities"""
+        facilities = (self.data["hydrogen_production"] +
+                      self.data["storage_facilities"] +
+                      self.data["demand_centers"])
+        if len(facilities) < 2:
+            return
+        
+        index = SphericalKDTree([(f["latitude"], f["longitude"]) for f in facilities])
+        for route in self.data["transport_infrastructure"]:
+            start, _ = index.nearest(route["start_latitude"], route["start_longitude"])
+            # Never let a route start and end at the same facility
+            end_candidates = index.k_nearest(route["end_latitude"], route["end_longitude"], 2)
+            end = end_candidates[0][0] if end_candidates[0][0] != start else end_candidates[1][0]
+            
+            start_facility = facilities[start]
+            end_facility = facilities[end]
+            route["start_facility_id"] = start_facility["id"]
+            route["end_facility_id"] = end_facility["id"]
+            route["start_latitude"] = start_facility["latitude"]
+            route["start_longitude"] = start_facility["longitude"]
+            route["end_latitude"] = end_facility["latitude"]
+            route["end_longitude"] = end_facility["longitude"]
+            route["distance_km"] = round(haversine_km(
+                start_facility["latitude"], start_facility["longitude"],
+                end_facility["latitude"], end_facility["longitude"]
+            ), 2)
+    
+    def generate_complete_dataset(self, counts: Dict[str, int] = None) -> Dict[str, Any]:
         """Generate complete realistic global dataset with all categories"""
         logging.info("Generating complete realistic global hydrogen infrastructure dataset...")
-        
-        # Generate data for each category
-        self.data["renewable_energy"] = self.generate_renewable_energy_data(65)
-        self.data["hydrogen_production"] = self.generate_hydrogen_production_data(60)
-        self.data["storage_facilities"] = self.generate_storage_facilities_data(55)
-        self.data["transport_infrastructure"] = self.generate_transport_infrastructure_data(62)
-        self.data["demand_centers"] = self.generate_demand_centers_data(58)
-        self.data["environmental_constraints"] = self.generate_environmental_constraints_data(53)
-        self.data["economic_data"] = self.generate_economic_data(57)
+        counts = {**DEFAULT_ENTRY_COUNTS, **(counts or {})}
+        
+        # Generate data for each category. Facilities come before transport so
+        # that routes can be linked to them afterwards.
+        self.data["renewable_energy"] = self.generate_renewable_energy_data(counts["renewable_energy"])
+        self.data["hydrogen_production"] = self.generate_hydrogen_production_data(counts["hydrogen_production"])
+        self.data["storage_facilities"] = self.generate_storage_facilities_data(counts["storage_facilities"])
+        self.data["demand_centers"] = self.generate_demand_centers_data(counts["demand_centers"])
+        self.data["transport_infrastructure"] = self.generate_transport_infrastructure_data(counts["transport_infrastructure"])
+        self.data["environmental_constraints"] = self.generate_environmental_constraints_data(counts["environmental_constraints"])
+        self.data["economic_data"] = self.generate_economic_data(counts["economic_data"])
+        
+        # Resolve cross-category references with spatial indexes
+        logging.info("Linking facilities to nearest renewable sites and transport endpoints...")
+        self.link_nearby_renewables()
+        self.link_transport_endpoints()
         
         # Update metadata
         self.data["metadata"]["entry_counts"] = {
@@ -679,8 +742,12 @@ class RealisticGlobalHydrogenDataGenerator:
         """Save data to JSON file"""
         logging.info(f"Saving realistic global data to {filename}...")
         
-        with open(filename, 'w') as f:
+        # Write to a temporary file and rename it into place, so a running
+        # dashboard watching this file never reads a half-written dataset
+        temp_filename = f"{filename}.tmp"
+        with open(temp_filename, 'w') as f:
             json.dump(self.data, f, indent=2, default=str)
+        os.replace(temp_filename, filename)
         
         logging.info(f"Realistic global data saved successfully to {filename}")
         
@@ -721,8 +788,67 @@ class RealisticGlobalHydrogenDataGenerator:
         
         return valid
 
-def main():
+def export_main(argv: List[str]) -> int:
+    """Export one category of a dataset file as GeoJSON or GeoParquet"""
+    # Only the export command pays for the dataset indexes and encoders
+    from dataset import Dataset
+    import export
+
+    parser = argparse.ArgumentParser(prog="collect_hydrogen_data.py export",
+                                     description="Export one category as GeoJSON or GeoParquet")
+    parser.add_argument("category")
+    parser.add_argument("--format", choices=sorted(export.FORMATS), default="geojson")
+    parser.add_argument("--input", default="realistic_global_hydrogen_infrastructure_data.json")
+    parser.add_argument("--output", help="file to write, - for stdout (default: <category>.<format>[.gz])")
+    parser.add_argument("--bbox", help="south,west,north,east in degrees")
+    parser.add_argument("--where", action="append", default=[], metavar="FIELD=VALUE",
+                        help="keep records whose field equals value; repeatable")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    args = parser.parse_args(argv)
+
+    filters = [("bbox", args.bbox)] if args.bbox else []
+    for condition in args.where:
+        field, separator, value = condition.partition("=")
+        if not separator:
+            parser.error(f"--where expects FIELD=VALUE, got {condition}")
+        filters.append((field, value))
+    try:
+        bbox, where = export.parse_filters(filters)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.input, 'r') as f:
+        dataset = Dataset(json.load(f))
+    try:
+        chunks = export.export(dataset, args.category, args.format, bbox, where, args.gzip)
+    except KeyError:
+        parser.error(f"unknown category {args.category}; choose from {', '.join(export.categories(dataset.data))}")
+    except ValueError as e:
+        parser.error(str(e))
+    except ImportError as e:
+        logging.error(str(e))
+        return 1
+
+    output = args.output or f"{args.category}.{args.format}{'.gz' if args.gzip else ''}"
+    out = sys.stdout.buffer if output == "-" else open(output, 'wb')
+    try:
+        written = 0
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    if output != "-":
+        logging.info(f"Exported {args.category} to {output} ({written} bytes)")
+    return 0
+
+def main(argv: List[str] = None):
     """Main execution function"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["export"]:
+        return export_main(argv[1:])
+
     print("Realistic Global Green Hydrogen Infrastructure Data Generator")
     print("=" * 65)
     print("Creating comprehensive realistic global dataset with 50+ entries per category...")
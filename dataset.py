@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Versioned, double-buffered dataset holder for the dashboard
+A Dataset bundles the raw data with every index derived from it; the
+DatasetManager builds new versions in the background and swaps them in atomically
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from enrichment import enrich_regions, build_region_index
+from export import property_types
+from influence import InfluenceField
+from siting import StorageIndex, SupplyIndex
+from metrics import REGISTRY, Counter
+from projection import Projection
+from transport import RouteGeometry, RouteIndex
+from stats import compute_statistics
+
+logger = logging.getLogger(__name__)
+
+DATASET_RELOADS = REGISTRY.register(Counter(
+    "hydrogen_dataset_reloads_total", "Dataset reloads, by outcome", ["outcome"]))
+
+# How many past versions clients can sync incrementally from
+HASH_HISTORY_VERSIONS = 10
+
+# Portfolio candidate matrices kept per dataset version; each can be tens of MB
+PORTFOLIO_CACHE_SIZE = 4
+
+# Projected target years kept per dataset version, each a full derived Dataset
+YEAR_CACHE_SIZE = 4
+
+
+def build_renewable_links(data):
+    """Precompute the renewable site -> linked production facilities join"""
+    links = {}
+    for facility in data.get('hydrogen_production', []):
+        source = facility.get('nearby_renewable_source')
+        if source:
+            links.setdefault(source, []).append(facility['id'])
+    return links
+
+
+def build_demand_fields(data, region_index):
+    """Demand influence fields, globally (key None) and per region"""
+    def field(records):
+        return InfluenceField([(record['latitude'], record['longitude']) for record in records],
+                              [record.get('annual_demand_tons', 0) for record in records])
+
+    fields = {None: field(data.get('demand_centers', []))}
+    for key, records in region_index.get('demand_centers', {}).items():
+        fields[key] = field(records)
+    return fields
+
+
+def record_key(record, position):
+    """Stable identity of a record within its category"""
+    return str(record.get('id', f'#{position}'))
+
+
+def record_hash(record):
+    """Content hash of a record, independent of key order"""
+    encoded = json.dumps(record, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def content_version(record_hashes, metadata):
+    """Version of a dataset derived from its content, so every worker that loads
+    the same data reports the same version and no two different datasets share one"""
+    digest = hashlib.blake2b(json.dumps(metadata, sort_keys=True, default=str).encode(), digest_size=8)
+    for category in sorted(record_hashes):
+        for key, value in sorted(record_hashes[category].items()):
+            digest.update(f"{category}\0{key}\0{value}\n".encode())
+    return digest.hexdigest()
+
+
+class Dataset:
+    """One immutable version of the served data and everything derived from it.
+
+    Requests pin the Dataset they started with, so a reload never changes
+    the data underneath a request that is already running.
+    """
+
+    def __init__(self, data: Dict[str, Any], generation: int = 0, version: Optional[str] = None):
+        # Install order within this process; version identifies the content
+        self.generation = generation
+        self.loaded_at = time.time()
+        # A view derived from an installed Dataset (a projected year) is given its
+        # version: its regions are already derived and it is never synced from
+        derived_view = version is not None
+        if not derived_view:
+            added = enrich_regions(data)
+            if added:
+                logger.info(f"Derived missing regions for {added} records")
+        self.data = data
+        self.renewable_links = build_renewable_links(data)
+        self.region_index = build_region_index(data)
+        # category -> record key -> record / content hash, for incremental sync
+        self.records_by_key: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.record_hashes: Dict[str, Dict[str, str]] = {}
+        for category, records in data.items():
+            if derived_view or category == 'metadata' or not isinstance(records, list):
+                continue
+            keyed = {record_key(record, position): record for position, record in enumerate(records)}
+            self.records_by_key[category] = keyed
+            self.record_hashes[category] = {key: record_hash(record) for key, record in keyed.items()}
+        self.version = version if derived_view else content_version(self.record_hashes, data.get('metadata', {}))
+        # Serialized response bodies, built on first request for this version
+        self.response_cache: Dict[str, str] = {}
+        self._portfolio_problems: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._portfolio_lock = threading.Lock()
+        # Indexes only some requests need, built on first use
+        self._derived: Dict[str, Any] = {}
+        self._derived_lock = threading.Lock()
+        self._years: "OrderedDict[int, Dataset]" = OrderedDict()
+        self._years_lock = threading.Lock()
+
+    def portfolio_problem(self, key: tuple, build: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Portfolio candidate matrix for key, built on first use; returns (problem, cached)"""
+        with self._portfolio_lock:
+            problem = self._portfolio_problems.get(key)
+            if problem is not None:
+                self._portfolio_problems.move_to_end(key)
+                return problem, True
+        problem = build()
+        with self._portfolio_lock:
+            self._portfolio_problems[key] = problem
+            while len(self._portfolio_problems) > PORTFOLIO_CACHE_SIZE:
+                self._portfolio_problems.popitem(last=False)
+        return problem, False
+
+
+    def _lazy(self, name: str, build: Callable[[], Any]) -> Any:
+        with self._derived_lock:
+            if name not in self._derived:
+                self._derived[name] = build()
+            return self._derived[name]
+
+    # Built by warm() before a reload swaps the version in, and in the background
+    # after a cold start, so only requests racing that first warm-up or against
+    # a projected year build them on the request path
+    WARMED = ('demand_fields', 'storage_index', 'supply_index', 'stats',
+              'projection', 'route_index', 'route_geometry')
+
+    def built(self, name: str) -> bool:
+        """Whether the derived index called name exists yet"""
+        return name in self._derived
+
+    def warm(self) -> None:
+        """Build the indexes the optimize, stats, routes and projection requests need"""
+        for name in self.WARMED:
+            index = getattr(self, name)
+            if inspect.ismethod(index):
+                index()
+
+    @property
+    def demand_fields(self) -> Dict[Any, InfluenceField]:
+        """Demand influence fields, globally (key None) and per region"""
+        return self._lazy('demand_fields', lambda: build_demand_fields(self.data, self.region_index))
+
+    @property
+    def storage_index(self) -> StorageIndex:
+        return self._lazy('storage_index', lambda: StorageIndex(self.data.get('storage_facilities', [])))
+
+    @property
+    def supply_index(self) -> SupplyIndex:
+        return self._lazy('supply_index', lambda: SupplyIndex(self.data.get('hydrogen_production', []),
+                                                              self.data.get('demand_centers', [])))
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return self._lazy('stats', lambda: compute_statistics(self.data))
+
+    def projection(self) -> Projection:
+        """Per-region, per-year capacity and demand series"""
+        return self._lazy('projection', lambda: Projection(self.data))
+
+    def route_index(self) -> RouteIndex:
+        """R-tree over transport route segments"""
+        return self._lazy('route_index', lambda: RouteIndex(self.data.get('transport_infrastructure', [])))
+
+    def route_geometry(self) -> RouteGeometry:
+        """Level-of-detail map polylines of the transport routes"""
+        return self._lazy('route_geometry', lambda: RouteGeometry(self.data.get('transport_infrastructure', [])))
+
+    def field_types(self, category: str) -> Dict[str, str]:
+        """Field -> export column type over every record of category"""
+        return self._lazy(f'field_types:{category}', lambda: property_types(self.data.get(category, [])))
+
+    def year_dataset(self, year: int) -> "Dataset":
+        """This version as projected to year, its indexes built on first use; raises
+        ValueError for years outside the projection horizon"""
+        projection = self.projection()
+        with self._years_lock:
+            dataset = self._years.get(year)
+            if dataset is not None:
+                self._years.move_to_end(year)
+                return dataset
+        dataset = Dataset(projection.projected_data(self.data, year), self.generation, f"{self.version}@{year}")
+        with self._years_lock:
+            self._years[year] = dataset
+            while len(self._years) > YEAR_CACHE_SIZE:
+                self._years.popitem(last=False)
+        return dataset
+
+
+class DatasetManager:
+    """Holds the current Dataset and rebuilds new versions off the request path"""
+
+    def __init__(self, loader: Callable[[str], Dict[str, Any]]):
+        self._loader = loader
+        self._current: Optional[Dataset] = None
+        self._generation = 0
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._hash_history: "OrderedDict[str, Dict[str, Dict[str, str]]]" = OrderedDict()
+        self.last_reload: Dict[str, Any] = {"status": "idle"}
+
+    @property
+    def current(self) -> Dataset:
+        return self._current
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def install(self, data: Dict[str, Any], warm: bool = True) -> Dataset:
+        """Build a Dataset from already-loaded data and make it current.
+
+        Without warm the new version is served before its optimizer indexes
+        exist; the caller should warm() it in the background.
+        """
+        with self._swap_lock:
+            self._generation += 1
+            generation = self._generation
+        dataset = Dataset(data, generation)
+        if warm:
+            dataset.warm()
+        with self._swap_lock:
+            # A slower, older rebuild must never replace a newer one
+            if self._current is None or self._current.generation < generation:
+                self._current = dataset
+            self._hash_history[dataset.version] = dataset.record_hashes
+            self._hash_history.move_to_end(dataset.version)
+            while len(self._hash_history) > HASH_HISTORY_VERSIONS:
+                self._hash_history.popitem(last=False)
+        return dataset
+
+    def changes_since(self, since: str, dataset: Dataset) -> Optional[Dict[str, Any]]:
+        """Records added, changed or removed between version `since` and dataset.
+
+        Returns None when this process never loaded `since` or has dropped it
+        from its history. Versions are content digests, so a version another
+        worker handed out diffs correctly here whenever this worker knows it.
+        """
+        old_hashes = self._hash_history.get(since)
+        if old_hashes is None:
+            return None
+        categories = {}
+        for category in set(old_hashes) | set(dataset.record_hashes):
+            old = old_hashes.get(category, {})
+            new = dataset.record_hashes.get(category, {})
+            records = dataset.records_by_key.get(category, {})
+            added = [records[key] for key in new if key not in old]
+            changed = [records[key] for key, digest in new.items() if key in old and old[key] != digest]
+            removed = [key for key in old if key not in new]
+            if added or changed or removed:
+                categories[category] = {"added": added, "changed": changed, "removed": removed}
+        return {
+            "from_version": since,
+            "to_version": dataset.version,
+            "metadata": dataset.data.get('metadata', {}),
+            "categories": categories
+        }
+
+    def reload(self, path: str) -> Optional[Dataset]:
+        """Load and build a new version from path; the old one serves until the swap"""
+        if not self._reload_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._reload(path)
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self, path: str) -> Optional[Dataset]:
+        """reload() for a caller holding _reload_lock"""
+        try:
+            self.last_reload = {"status": "running", "path": path, "started_at": time.time()}
+            start = time.perf_counter()
+            dataset = self.install(self._loader(path))
+            self.last_reload = {
+                "status": "succeeded",
+                "path": path,
+                "version": dataset.version,
+                "seconds": round(time.perf_counter() - start, 3)
+            }
+            DATASET_RELOADS.inc(outcome="succeeded")
+            logger.info(f"Dataset version {dataset.version} loaded from {path}")
+            return dataset
+        except Exception as e:
+            self.last_reload = {"status": "failed", "path": path, "error": str(e)}
+            DATASET_RELOADS.inc(outcome="failed")
+            logger.error(f"Dataset reload from {path} failed, keeping version {self._current.version}: {str(e)}")
+            return None
+
+    def reload_in_background(self, path: str) -> bool:
+        """Start a reload thread; returns False if a reload is already running"""
+        if self.reloading:
+            return False
+        threading.Thread(target=self.reload, args=(path,), name="dataset-reload", daemon=True).start()
+        return True
+
+    def watch(self, path: str, interval: float) -> None:
+        """Poll path for modifications and reload whenever it changes"""
+        if self._watcher is not None:
+            return
+
+        def poll():
+            last_mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            while True:
+                time.sleep(interval)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if mtime != last_mtime:
+                    logger.info(f"{path} changed, reloading dataset")
+                    # Wait out a reload already running rather than skip this change;
+                    # a failed reload is retried when the file changes again
+                    with self._reload_lock:
+                        self._reload(path)
+                    last_mtime = mtime
+
+        self._watcher = threading.Thread(target=poll, name="dataset-watcher", daemon=True)
+        self._watcher.start()
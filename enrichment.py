@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Load-time enrichment of infrastructure records
+Fills in missing regions from the country, or from coordinates when the
+country is unknown, and builds normalized lookup indexes
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+
+GLOBAL_REGION = "global"
+
+# Country -> region, matching the regions used by the economic data
+COUNTRY_REGIONS = {
+    "United States": "North America", "USA": "North America", "Canada": "North America",
+    "Mexico": "North America",
+    "Brazil": "South America", "Argentina": "South America", "Chile": "South America",
+    "Colombia": "South America",
+    "Germany": "Europe", "United Kingdom": "Europe", "France": "Europe", "Italy": "Europe",
+    "Spain": "Europe", "Netherlands": "Europe", "Russia": "Europe", "Turkey": "Europe",
+    "Switzerland": "Europe", "Sweden": "Europe", "Poland": "Europe", "Belgium": "Europe",
+    "Austria": "Europe", "Norway": "Europe", "Denmark": "Europe", "Finland": "Europe",
+    "China": "Asia", "Japan": "Asia", "India": "Asia", "South Korea": "Asia",
+    "Indonesia": "Asia", "Thailand": "Asia", "Philippines": "Asia", "Singapore": "Asia",
+    "Malaysia": "Asia",
+    "Saudi Arabia": "Middle East", "Iran": "Middle East", "United Arab Emirates": "Middle East",
+    "Israel": "Middle East",
+    "South Africa": "Africa", "Nigeria": "Africa", "Egypt": "Africa", "Kenya": "Africa",
+    "Morocco": "Africa",
+    "Australia": "Oceania", "New Zealand": "Oceania"
+}
+
+# Coarse region boxes (min_lat, max_lat, min_lon, max_lon); earlier entries win on overlap
+REGION_BOUNDS = [
+    ("Middle East", 12, 42, 34, 63),
+    ("Europe", 35, 72, -25, 60),
+    ("Africa", -36, 38, -20, 52),
+    ("North America", 7, 84, -170, -50),
+    ("South America", -56, 13, -92, -30),
+    ("Oceania", -50, 0, 110, 180),
+    ("Asia", -11, 78, 60, 180),
+    ("Asia", 0, 55, 42, 60)
+]
+
+GRID_DEGREES = 10
+
+
+class RegionLocator:
+    """Point-in-region index: a coarse lat/lon grid pointing at candidate region boxes"""
+
+    def __init__(self, bounds=REGION_BOUNDS, grid_degrees: int = GRID_DEGREES):
+        self.bounds = list(bounds)
+        self.grid_degrees = grid_degrees
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for position, (_, min_lat, max_lat, min_lon, max_lon) in enumerate(self.bounds):
+            for row in range(self._row(min_lat), self._row(max_lat) + 1):
+                for col in range(self._col(min_lon), self._col(max_lon) + 1):
+                    self._cells.setdefault((row, col), []).append(position)
+
+    def _row(self, lat: float) -> int:
+        return int((min(max(lat, -90), 89.999) + 90) // self.grid_degrees)
+
+    def _col(self, lon: float) -> int:
+        return int((min(max(lon, -180), 179.999) + 180) // self.grid_degrees)
+
+    def locate(self, lat: float, lon: float) -> Optional[str]:
+        for position in self._cells.get((self._row(lat), self._col(lon)), []):
+            region, min_lat, max_lat, min_lon, max_lon = self.bounds[position]
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                return region
+        return None
+
+
+REGION_LOCATOR = RegionLocator()
+
+
+def normalize(value: Any) -> str:
+    """Normalized form used for case-insensitive lookups"""
+    return str(value or "").strip().lower()
+
+
+def _record_position(record: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    if "latitude" in record:
+        return record.get("latitude"), record.get("longitude")
+    return record.get("start_latitude"), record.get("start_longitude")
+
+
+def enrich_regions(data: Dict[str, Any]) -> int:
+    """Fill in missing `region` fields in place and return how many were added"""
+    # Records that carry both country and region teach us the mapping used in this
+    # dataset; it wins over the static table, which only fills the countries it lacks
+    country_regions: Dict[str, str] = {}
+    for records in data.values():
+        if isinstance(records, list):
+            for record in records:
+                if record.get("country") and record.get("region"):
+                    country_regions.setdefault(record["country"], record["region"])
+    for country, region in COUNTRY_REGIONS.items():
+        country_regions.setdefault(country, region)
+
+    added = 0
+    for category, records in data.items():
+        if category == "metadata" or not isinstance(records, list):
+            continue
+        for record in records:
+            if record.get("region"):
+                continue
+            region = country_regions.get(record.get("country"))
+            if region is None:
+                lat, lon = _record_position(record)
+                if lat is not None and lon is not None:
+                    region = REGION_LOCATOR.locate(lat, lon)
+            if region:
+                record["region"] = region
+                added += 1
+    return added
+
+
+def build_region_index(data: Dict[str, Any]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """category -> normalized region -> records, for O(1) regional filtering"""
+    index = {}
+    for category, records in data.items():
+        if category == "metadata" or not isinstance(records, list):
+            continue
+        by_region: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            by_region.setdefault(normalize(record.get("region")), []).append(record)
+        index[category] = by_region
+    return index
+
+
+def region_key(selected_region: Any) -> Optional[str]:
+    """Normalized region key, or None when the request is global"""
+    key = normalize(selected_region)
+    return None if key in ("", GLOBAL_REGION) else key
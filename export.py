@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+GeoJSON and GeoParquet export of dataset categories
+Features are selected with the dataset's region and route indexes, then
+encoded a chunk at a time straight from the records, so an export's memory
+use depends on the chunk size rather than on how many features it holds
+"""
+
+import json
+import struct
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from enrichment import normalize, region_key
+from startup import optional_import
+from transport import route_vertices
+
+# Media type of each export format
+FORMATS = {
+    'geojson': 'application/geo+json',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Features per encoded GeoJSON chunk, and per Parquet row group
+CHUNK_FEATURES = 1000
+ROW_GROUP_FEATURES = 10000
+
+Bbox = Tuple[float, float, float, float]
+Feature = Tuple[Dict[str, Any], Dict[str, Any]]
+
+
+def categories(data: Dict[str, Any]) -> List[str]:
+    return [category for category, records in data.items() if category != 'metadata' and isinstance(records, list)]
+
+
+def parse_filters(args: Iterable[Tuple[str, str]]) -> Tuple[Optional[Bbox], Dict[str, str]]:
+    """(bbox, field filters) from query parameters; raises ValueError for a malformed bbox.
+
+    bbox is south,west,north,east in degrees, like /api/routes; every other
+    parameter keeps only records whose field equals its value, ignoring case.
+    export() rejects parameters that are not fields of the category.
+    """
+    bbox, where = None, {}
+    for key, value in args:
+        if key == 'bbox':
+            try:
+                bbox = tuple(float(part) for part in value.split(','))
+            except ValueError:
+                bbox = ()
+            if len(bbox) != 4:
+                raise ValueError("bbox must be south,west,north,east in degrees")
+        else:
+            where[key] = value
+    return bbox, where
+
+
+def geometry(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """GeoJSON geometry of a record: its route as a LineString, or its location as a Point"""
+    vertices = route_vertices(record) if 'start_latitude' in record or 'path' in record else []
+    if len(vertices) >= 2:
+        return {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in vertices]}
+    if record.get('latitude') is None or record.get('longitude') is None:
+        return None
+    return {"type": "Point", "coordinates": [record['longitude'], record['latitude']]}
+
+
+def _positions(shape: Dict[str, Any]) -> List[List[float]]:
+    return [shape['coordinates']] if shape['type'] == 'Point' else shape['coordinates']
+
+
+def intersects(shape: Dict[str, Any], bbox: Bbox) -> bool:
+    """Whether the geometry's bounding box overlaps bbox; west > east wraps the antimeridian"""
+    south, west, north, east = bbox
+    positions = _positions(shape)
+    lats = [lat for _, lat in positions]
+    if max(lats) < south or min(lats) > north:
+        return False
+    lons = [lon for lon, _ in positions]
+    low, high = min(lons), max(lons)
+    if west <= east:
+        return high >= west and low <= east
+    return high >= west or low <= east
+
+
+def select(dataset: Any, category: str, bbox: Optional[Bbox] = None,
+           where: Optional[Dict[str, str]] = None) -> Iterator[Feature]:
+    """(record, geometry) for every record of category matching bbox and the field filters.
+
+    A region filter reads only that region's records from the region index
+    and a bbox over transport routes reads only the routes the R-tree finds
+    near it, so neither scans the whole category.
+    """
+    where = {field: normalize(value) for field, value in (where or {}).items()}
+    records = dataset.data.get(category, [])
+    region = region_key(where.pop('region', None))
+    if region is not None:
+        records = dataset.region_index.get(category, {}).get(region, [])
+    elif bbox is not None and category == 'transport_infrastructure':
+        route_index = dataset.route_index()
+        records = [route_index.routes[index] for index in route_index.in_box(*bbox)]
+
+    for record in records:
+        if any(normalize(record.get(field)) != value for field, value in where.items()):
+            continue
+        shape = geometry(record)
+        if shape is None or (bbox is not None and not intersects(shape, bbox)):
+            continue
+        yield record, shape
+
+
+def _chunks(features: Iterator[Feature], size: int) -> Iterator[List[Feature]]:
+    chunk = []
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def geojson_chunks(features: Iterator[Feature], chunk_features: int = CHUNK_FEATURES) -> Iterator[bytes]:
+    """A GeoJSON FeatureCollection, encoded chunk_features features at a time"""
+    yield b'{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for chunk in _chunks(features, chunk_features):
+        encoded = ', '.join(
+            json.dumps({"type": "Feature", "id": record.get('id'), "geometry": shape, "properties": record},
+                       default=str)
+            for record, shape in chunk
+        )
+        yield f"{separator}{encoded}".encode()
+        separator = ', '
+    yield b']}'
+
+
+def property_types(records: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """field -> 'bool', 'int64', 'float64' or 'string' over every record of a category.
+
+    Nested and mixed-type values are exported as JSON text. The schema comes
+    from the whole category so filtered exports of it all share one schema.
+    """
+    seen: Dict[str, set] = {}
+    for record in records:
+        for field, value in record.items():
+            kinds = seen.setdefault(field, set())
+            if value is not None:
+                kinds.add(type(value))
+    types = {}
+    for field, kinds in seen.items():
+        if kinds == {bool}:
+            types[field] = 'bool'
+        elif kinds == {int}:
+            types[field] = 'int64'
+        elif kinds and kinds <= {int, float}:
+            types[field] = 'float64'
+        else:
+            types[field] = 'string'
+    return types
+
+
+def wkb(shape: Dict[str, Any]) -> bytes:
+    """Little-endian WKB of a Point or LineString"""
+    if shape['type'] == 'Point':
+        return struct.pack('<BIdd', 1, 1, *shape['coordinates'])
+    coordinates = shape['coordinates']
+    return struct.pack(f'<BII{2 * len(coordinates)}d', 1, 2, len(coordinates),
+                       *(value for position in coordinates for value in position))
+
+
+class _Drain:
+    """Write-only file handing back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def parquet_chunks(features: Iterator[Feature], types: Dict[str, str],
+                   row_group_features: int = ROW_GROUP_FEATURES) -> Iterator[bytes]:
+    """A GeoParquet 1.0 file with WKB geometries, one row group at a time.
+
+    Imports pyarrow when called, before the first chunk is produced, so a
+    missing dependency fails the request up front instead of mid-stream.
+    """
+    pa = optional_import('pyarrow', 'GeoParquet export')
+    pq = optional_import('pyarrow.parquet', 'GeoParquet export')
+
+    arrow_types = {'bool': pa.bool_(), 'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string()}
+    columns = [field for field in types if field != 'geometry']
+    schema = pa.schema([pa.field(field, arrow_types[types[field]]) for field in columns]
+                       + [pa.field('geometry', pa.binary())])
+
+    def encode(value, kind):
+        if value is None or kind != 'string' or isinstance(value, str):
+            return value
+        return json.dumps(value, default=str)
+
+    def generate():
+        sink = _Drain()
+        geometry_types = set()
+        writer = None
+        for chunk in _chunks(features, row_group_features):
+            if writer is None:
+                # The geo metadata must be known before the first row group: every
+                # record of a category has the same kind of geometry
+                geometry_types.add(chunk[0][1]['type'])
+                writer = pq.ParquetWriter(sink, schema.with_metadata(_geo_metadata(geometry_types)))
+            arrays = [pa.array([encode(record.get(field), types[field]) for record, _ in chunk],
+                               type=schema.field(field).type) for field in columns]
+            arrays.append(pa.array([wkb(shape) for _, shape in chunk], type=pa.binary()))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=writer.schema))
+            yield sink.drain()
+        if writer is None:
+            writer = pq.ParquetWriter(sink, schema.with_metadata(_geo_metadata(geometry_types)))
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def _geo_metadata(geometry_types: set) -> Dict[bytes, bytes]:
+    return {b'geo': json.dumps({
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": "WKB", "geometry_types": sorted(geometry_types)}}
+    }).encode()}
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a stream of chunks without holding more than one at a time"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export(dataset: Any, category: str, fmt: str, bbox: Optional[Bbox] = None,
+           where: Optional[Dict[str, str]] = None, compress: bool = False) -> Iterator[bytes]:
+    """Encoded chunks of one category's export; raises KeyError for an unknown category or
+    format, ValueError for a filter on a field the category does not have (a typo or a
+    cache-buster would otherwise export nothing) and ImportError when the format's
+    optional dependency is missing"""
+    if category not in categories(dataset.data) or fmt not in FORMATS:
+        raise KeyError(f"{category}.{fmt}")
+    types = dataset.field_types(category)
+    unknown = sorted(set(where or {}) - set(types))
+    if unknown:
+        raise ValueError(f"{category} has no field {', '.join(unknown)}; "
+                         f"filter on one of {', '.join(sorted(types))}")
+    features = select(dataset, category, bbox, where)
+    if fmt == 'parquet':
+        chunks = parquet_chunks(features, types)
+    else:
+        chunks = geojson_chunks(features)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Demand influence sums with a cutoff radius and a far-field approximation
+The optimizer scores a site by sum(weight / (distance + 1)) over demand
+centers; centers far outside the influence radius are taken in aggregate
+from a hierarchical grid of demand totals, with a guaranteed error bound
+"""
+
+import heapq
+import math
+from typing import List, Optional, Sequence, Tuple
+
+from spatial import EARTH_RADIUS_KM, haversine_km, to_unit_vector
+
+# Cell sizes in degrees, coarsest first; each level halves the one above it
+GRID_LEVELS = (40, 20, 10, 5, 2.5, 1.25)
+
+DEFAULT_RADIUS_KM = 500.0
+DEFAULT_TOLERANCE = 0.05
+
+# Below this many points a plain exact sum is cheaper than walking the grid
+MIN_APPROXIMATED_POINTS = 128
+
+
+class _Cell:
+    """Grid cell: total weight, weighted centroid and the distance to its farthest member"""
+
+    __slots__ = ("weight", "lat", "lon", "cos_lat", "extent_km", "children", "members")
+
+    def __init__(self):
+        self.children: List["_Cell"] = []
+        self.members: List[int] = []
+
+
+class InfluenceField:
+    """Hierarchical grid over weighted points for fast sum(w / (d + 1)) queries.
+
+    A cell whose members all lie beyond the influence radius is replaced by
+    its total weight at its centroid. If the centroid is D km away and no
+    member is more than r km from it, every member distance lies in
+    [D - r, D + r], so since 1/(d + 1) is convex and decreasing the error is
+    at most W * (1/(D - r + 1) - 1/(D + 1)), a relative error of r/(D - r + 1).
+    Cells are only approximated when that relative error is within the
+    tolerance; everything else is refined down to exact per-point terms.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]], weights: Sequence[float]):
+        self._points = list(points)
+        self._weights = [float(weight or 0) for weight in weights]
+        self._lats = [math.radians(lat) for lat, _ in self._points]
+        self._lons = [math.radians(lon) for _, lon in self._points]
+        self._cos_lats = [math.cos(lat) for lat in self._lats]
+        self._roots = self._build()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _build(self) -> List[_Cell]:
+        finest = GRID_LEVELS[-1]
+        depth = len(GRID_LEVELS) - 1
+        # Leaf cells keyed by their row/column at the finest level
+        groups = {}
+        for i, (lat, lon) in enumerate(self._points):
+            key = (int((min(lat, 89.999) + 90) // finest), int((min(lon, 179.999) + 180) // finest))
+            groups.setdefault(key, []).append(i)
+        cells = {}
+        for key, members in groups.items():
+            cell = _Cell()
+            cell.members = members
+            cells[key] = cell
+
+        # Each coarser level merges 2x2 blocks of the level below
+        for _ in range(depth):
+            parents = {}
+            for (row, col), cell in cells.items():
+                parent = parents.get((row >> 1, col >> 1))
+                if parent is None:
+                    parent = parents[(row >> 1, col >> 1)] = _Cell()
+                parent.children.append(cell)
+                parent.members.extend(cell.members)
+            cells = parents
+
+        roots = [self._collapse(cell) for cell in cells.values()]
+        stack = list(roots)
+        while stack:
+            cell = stack.pop()
+            self._summarize(cell)
+            cell.children = [self._collapse(child) for child in cell.children]
+            stack.extend(cell.children)
+            if cell.children:
+                cell.members = []  # Only leaves keep their members
+        return roots
+
+    @staticmethod
+    def _collapse(cell: _Cell) -> _Cell:
+        """Skip levels where a cell has a single child; sparse areas become shallow"""
+        while len(cell.children) == 1:
+            cell = cell.children[0]
+        return cell
+
+    def _summarize(self, cell: _Cell) -> None:
+        weights = [self._weights[i] for i in cell.members]
+        total = sum(weights)
+        if total <= 0:
+            weights = [1.0] * len(weights)
+        x = y = z = 0.0
+        for i, weight in zip(cell.members, weights):
+            px, py, pz = to_unit_vector(*self._points[i])
+            x += weight * px
+            y += weight * py
+            z += weight * pz
+        norm = math.sqrt(x * x + y * y + z * z)
+        if norm < 1e-12:
+            lat, lon = self._points[cell.members[0]]
+        else:
+            lat = math.degrees(math.asin(max(-1.0, min(1.0, z / norm))))
+            lon = math.degrees(math.atan2(y, x))
+        cell.weight = total
+        cell.lat = math.radians(lat)
+        cell.lon = math.radians(lon)
+        cell.cos_lat = math.cos(cell.lat)
+        cell.extent_km = max(haversine_km(lat, lon, *self._points[i]) for i in cell.members)
+
+    def evaluate(self, lat: float, lon: float, radius_km: Optional[float] = DEFAULT_RADIUS_KM,
+                 tolerance: float = DEFAULT_TOLERANCE, contributors: Optional[List[Tuple[float, int]]] = None,
+                 top: int = 0) -> Tuple[float, float, int, int]:
+        """Return (sum, error_bound, exact_terms, approximated_cells).
+
+        The exact sum lies within error_bound of the returned sum. With
+        radius_km None or tolerance 0 every term is exact. Given a
+        contributors list, the largest `top` exact terms are kept in it as a
+        min-heap of (term, point index) during the same pass; far-field
+        cells are never itemized.
+        """
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        cos_phi = math.cos(phi)
+        sin = math.sin
+        asin = math.asin
+        sqrt = math.sqrt
+        diameter = 2 * EARTH_RADIUS_KM
+        lats, lons, cos_lats, weights = self._lats, self._lons, self._cos_lats, self._weights
+
+        if radius_km is None or tolerance <= 0 or len(self) < MIN_APPROXIMATED_POINTS:
+            total = 0.0
+            if contributors is not None:
+                for i in range(len(self)):
+                    half_dlat = sin((lats[i] - phi) / 2)
+                    half_dlon = sin((lons[i] - lam) / 2)
+                    a = half_dlat * half_dlat + cos_phi * cos_lats[i] * half_dlon * half_dlon
+                    term = weights[i] / (diameter * asin(sqrt(a if a < 1.0 else 1.0)) + 1)
+                    total += term
+                    if len(contributors) < top:
+                        heapq.heappush(contributors, (term, i))
+                    elif term > contributors[0][0]:
+                        heapq.heapreplace(contributors, (term, i))
+                return total, 0.0, len(self), 0
+            for p_lat, p_lon, p_cos, weight in zip(lats, lons, cos_lats, weights):
+                half_dlat = sin((p_lat - phi) / 2)
+                half_dlon = sin((p_lon - lam) / 2)
+                a = half_dlat * half_dlat + cos_phi * p_cos * half_dlon * half_dlon
+                total += weight / (diameter * asin(sqrt(a if a < 1.0 else 1.0)) + 1)
+            return total, 0.0, len(self), 0
+
+        total = 0.0
+        error_bound = 0.0
+        exact_terms = 0
+        approximated = 0
+        stack = list(self._roots)
+        while stack:
+            cell = stack.pop()
+            if len(cell.members) != 1:
+                half_dlat = sin((cell.lat - phi) / 2)
+                half_dlon = sin((cell.lon - lam) / 2)
+                a = half_dlat * half_dlat + cos_phi * cell.cos_lat * half_dlon * half_dlon
+                distance = diameter * asin(sqrt(a if a < 1.0 else 1.0))
+                nearest = distance - cell.extent_km
+                if nearest > radius_km and cell.extent_km <= tolerance * (nearest + 1):
+                    total += cell.weight / (distance + 1)
+                    error_bound += cell.weight * (1 / (nearest + 1) - 1 / (distance + 1))
+                    approximated += 1
+                    continue
+            if cell.children:
+                stack.extend(cell.children)
+                continue
+            for i in cell.members:
+                half_dlat = sin((lats[i] - phi) / 2)
+                half_dlon = sin((lons[i] - lam) / 2)
+                a = half_dlat * half_dlat + cos_phi * cos_lats[i] * half_dlon * half_dlon
+                term = weights[i] / (diameter * asin(sqrt(a if a < 1.0 else 1.0)) + 1)
+                total += term
+                if contributors is not None:
+                    if len(contributors) < top:
+                        heapq.heappush(contributors, (term, i))
+                    elif term > contributors[0][0]:
+                        heapq.heapreplace(contributors, (term, i))
+            exact_terms += len(cell.members)
+        return total, error_bound, exact_terms, approximated
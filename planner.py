@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Cost-based planning for single-site optimizations
+Estimates how many renewables, candidate sites and demand terms a request
+will touch from the region index, the dataset statistics, a sample of the
+pool and one probe of the demand field, then picks how to evaluate demand
+from those counts alone, so equal requests on equal data always get the
+same answer; measured runs recalibrate only the time estimate that decides
+where a plan runs
+"""
+
+import bisect
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from influence import DEFAULT_RADIUS_KM, MIN_APPROXIMATED_POINTS, InfluenceField
+from metrics import REGISTRY, Counter
+from spatial import haversine_km
+from stats import PERCENTILES
+
+PLANS_CHOSEN = REGISTRY.register(Counter(
+    "hydrogen_optimize_plans_total", "Single-site optimization plans, by strategy and execution",
+    ["strategy", "execution"]))
+
+# optimize_location scores candidates around at most this many suitable renewables
+MAX_RENEWABLES = 20
+
+# Candidate grid around each renewable: (lat, lon) offsets in degrees
+GRID_OFFSETS = [(i * 0.5, j * 0.5) for i in range(-2, 3) for j in range(-2, 3)]
+
+# Pool sites sampled to estimate how many grid points fall within reach
+GRID_SAMPLE_SITES = 5
+
+# Exact demand sums are chosen while they cost at most this many times the
+# far-field approximation per candidate, or under EXACT_TERMS_BUDGET terms in all
+EXACT_PREMIUM = 1.25
+EXACT_TERMS_BUDGET = 12500
+
+# Plans estimated to finish within this many milliseconds run on the event loop
+# instead of paying for a hand-off to the worker pool, provided they use no
+# optional scoring term and every index they read is already built
+INLINE_MS_LIMIT = 1.0
+
+# Per-candidate work besides demand scoring (grid point, filters, best-site
+# bookkeeping), in units of one demand term
+CANDIDATE_OVERHEAD_TERMS = 8
+
+# Extra per-candidate work of each optional scoring term, in units of one
+# demand term, measured on the x10 benchmark dataset
+OPTION_TERMS = {'storage': 20, 'competition': 200, 'near_transport': 100, 'explain': 100}
+
+# Cost of one unit of work per strategy: fixed weights for choosing a strategy,
+# and the starting point of the calibrated time estimate
+DEFAULT_MS_PER_UNIT = {'exact': 0.0004, 'far_field': 0.0008}
+
+# Weight of each new measurement in the calibrated cost per unit
+CALIBRATION_WEIGHT = 0.2
+
+
+def capacity_selectivity(summary: Optional[Dict[str, Any]], min_capacity: float) -> float:
+    """Share of records with at least min_capacity, interpolated between the stored percentiles"""
+    if not summary or not summary.get('count'):
+        return 1.0
+    points = [(0.0, summary['min'])] + [(p / 100, summary[f'p{p}']) for p in PERCENTILES] + [(1.0, summary['max'])]
+    if min_capacity <= points[0][1]:
+        return 1.0
+    if min_capacity > points[-1][1]:
+        return 0.0
+    values = [value for _, value in points]
+    upper = bisect.bisect_left(values, min_capacity)
+    (q0, v0), (q1, v1) = points[upper - 1], points[upper]
+    below = q1 if v1 == v0 else q0 + (q1 - q0) * (min_capacity - v0) / (v1 - v0)
+    return 1.0 - below
+
+
+def type_selectivity(summary: Optional[Dict[str, Any]], renewable_type: str, count: int) -> float:
+    """Share of renewables of the requested type, from the stored value counts"""
+    if renewable_type in ('any', '') or not summary or 'values' not in summary or not count:
+        return 1.0
+    accepted = {renewable_type, 'photovoltaic'} if renewable_type == 'solar' else {renewable_type}
+    return sum(n for value, n in summary['values'].items() if value.lower() in accepted) / count
+
+
+def grid_points(latitude: float, max_distance_km: float) -> int:
+    """Candidate grid points within max_distance_km of a renewable at this latitude"""
+    return sum(1 for d_lat, d_lon in GRID_OFFSETS
+               if haversine_km(latitude, 0.0, max(-85, min(85, latitude + d_lat)), d_lon) <= max_distance_km)
+
+
+def mean_grid_points(renewable_pool: Sequence[Dict[str, Any]], max_distance_km: float) -> float:
+    """Candidate grid points per renewable, averaged over a few sites spread through the pool"""
+    sample = renewable_pool[::max(1, len(renewable_pool) // GRID_SAMPLE_SITES)][:GRID_SAMPLE_SITES]
+    if not sample:
+        return 0.0
+    return sum(grid_points(site['latitude'], max_distance_km) for site in sample) / len(sample)
+
+
+def candidate_terms(options: Sequence[str]) -> int:
+    """Per-candidate work besides demand scoring, with the given optional terms enabled"""
+    return CANDIDATE_OVERHEAD_TERMS + sum(OPTION_TERMS[option] for option in options)
+
+
+class CostModel:
+    """Milliseconds per unit of work for each strategy, an exponential moving average of measured runs"""
+
+    def __init__(self):
+        self._ms_per_unit = dict(DEFAULT_MS_PER_UNIT)
+        self._lock = threading.Lock()
+
+    def ms(self, strategy: str, units: float) -> float:
+        return units * self._ms_per_unit[strategy]
+
+    def observe(self, strategy: str, units: float, ms: float) -> None:
+        if units <= 0:
+            return
+        with self._lock:
+            self._ms_per_unit[strategy] += CALIBRATION_WEIGHT * (ms / units - self._ms_per_unit[strategy])
+
+
+COST_MODEL = CostModel()
+
+
+class Plan:
+    """How one optimization evaluates demand and where it runs, with its estimated cost.
+
+    strategy 'exact' sums every demand term; 'far_field' takes distant demand
+    from the influence grid within demand_tolerance. execution 'inline' runs
+    on the ASGI event loop, 'worker_pool' on the optimize threads; the Flask
+    app runs every plan on its request thread, so the report says where the
+    plan actually ran next to where it was planned to.
+    """
+
+    def __init__(self, strategy: str, execution: str, demand_radius_km: Optional[float],
+                 demand_tolerance: float, requested: bool, options: Sequence[str], estimated: Dict[str, Any]):
+        self.strategy = strategy
+        self.execution = execution
+        self.demand_radius_km = demand_radius_km
+        self.demand_tolerance = demand_tolerance
+        self.requested = requested
+        self.options = list(options)
+        self.estimated = estimated
+
+    def finish(self, renewables: int, candidates: int, demand_units: int, ms: float,
+               execution: str) -> Dict[str, Any]:
+        """Record the measured cost, recalibrate the model and return the plan for the response"""
+        units = demand_units + candidates * candidate_terms(self.options)
+        COST_MODEL.observe(self.strategy, units, ms)
+        return {
+            "strategy": self.strategy,
+            "execution": execution,
+            "planned_execution": self.execution,
+            "chosen_by": "request" if self.requested else "cost",
+            "demand_radius_km": self.demand_radius_km,
+            "demand_tolerance": self.demand_tolerance,
+            "options": self.options,
+            "estimated": self.estimated,
+            "actual": {"renewables": renewables, "candidates": candidates, "cost": units, "ms": round(ms, 3)}
+        }
+
+
+def plan(renewable_summary: Dict[str, Any], renewable_pool: Sequence[Dict[str, Any]],
+         demand_field: InfluenceField, renewable_type: str, min_capacity: float,
+         max_distance_km: float, demand_radius_km: Optional[float], demand_tolerance: float,
+         requested: bool, options: Sequence[str] = (), indexes_built: bool = True) -> Plan:
+    """Plan an optimization before any candidate is scored.
+
+    Suitable renewables are the pool size times the technology and capacity
+    selectivity from the statistics; candidates are those times the grid
+    points in reach around a sample of pool sites. An exact demand sum costs
+    one term per demand center; the far-field cost per candidate is taken
+    from one probe of the field at a pool site. The strategy depends only on
+    these counts, never on measured timings. A request that sets
+    demand_radius_km or demand_tolerance keeps its own strategy. options are
+    the optional scoring terms the request enables; a plan with any of them,
+    or whose indexes are not built yet, never runs inline.
+    """
+    fields = renewable_summary.get('numeric', {})
+    selectivity = (type_selectivity(renewable_summary.get('categorical', {}).get('type'), renewable_type,
+                                    renewable_summary.get('count', 0))
+                   * capacity_selectivity(fields.get('capacity_mw'), min_capacity))
+    renewables = round(len(renewable_pool) * selectivity)
+    # No match at all falls back to relaxed filters, at worst the first few sites
+    renewables = min(MAX_RENEWABLES, renewables or min(len(renewable_pool), 10))
+    candidates = round(renewables * mean_grid_points(renewable_pool, max_distance_km))
+    demand_centers = len(demand_field)
+    other_terms = candidate_terms(options)
+
+    if demand_centers < MIN_APPROXIMATED_POINTS or demand_radius_km is None or demand_tolerance <= 0:
+        # The field sums exactly whatever is asked
+        strategy, demand_terms, demand_radius_km = 'exact', demand_centers, None
+    else:
+        probe_radius = demand_radius_km if requested else DEFAULT_RADIUS_KM
+        probe = renewable_pool[0] if renewable_pool else None
+        _, _, exact_terms, cells = (demand_field.evaluate(probe['latitude'], probe['longitude'],
+                                                          probe_radius, demand_tolerance)
+                                    if probe else (None, None, demand_centers, 0))
+        # Weighed at the default cost per term, not the calibrated one, so that
+        # timing noise can never change which strategy (and result) a request gets
+        exact_cost = DEFAULT_MS_PER_UNIT['exact'] * demand_centers
+        far_field_cost = DEFAULT_MS_PER_UNIT['far_field'] * (exact_terms + cells)
+        if requested or (candidates * demand_centers > EXACT_TERMS_BUDGET
+                         and exact_cost > EXACT_PREMIUM * far_field_cost):
+            strategy, demand_terms = 'far_field', exact_terms + cells
+        else:
+            strategy, demand_terms, demand_radius_km = 'exact', demand_centers, None
+    units = candidates * (demand_terms + other_terms)
+    ms = COST_MODEL.ms(strategy, units)
+    execution = 'inline' if ms <= INLINE_MS_LIMIT and not options and indexes_built else 'worker_pool'
+    PLANS_CHOSEN.inc(strategy=strategy, execution=execution)
+    return Plan(strategy, execution, demand_radius_km, demand_tolerance, requested, options, {
+        "renewables": renewables,
+        "candidates": candidates,
+        "demand_centers": demand_centers,
+        "cost": units,
+        "ms": round(ms, 3)
+    })
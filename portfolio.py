@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Multi-site portfolio optimization
+Chooses several electrolyzer sites together as a facility-location problem:
+each demand center is served by its nearest open site within the coverage
+radius, sites may have a production capacity, and a greedy placement is
+improved by pairwise swaps until the time budget runs out
+"""
+
+import heapq
+import math
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from spatial import EARTH_RADIUS_KM, DistanceTable, haversine_km
+
+DEFAULT_COVERAGE_KM = 500.0
+DEFAULT_TIME_BUDGET_SECONDS = 2.0
+MAX_TIME_BUDGET_SECONDS = 10.0
+MAX_SITES = 50
+
+
+class _Assignment:
+    """Open sites and which one serves each demand center"""
+
+    def __init__(self, demand_count: int):
+        self.open: List[int] = []
+        self.best = [0.0] * demand_count   # proximity value of the serving site
+        self.site = [-1] * demand_count    # serving candidate, -1 when uncovered
+        self.value: Dict[int, float] = {}  # candidate -> proximity value it serves
+        self.load: Dict[int, float] = {}   # candidate -> demand it serves, tonnes/day
+
+
+class PortfolioProblem:
+    """Candidate sites x demand centers, with the sparse proximity matrix precomputed.
+
+    The objective matches optimize_location's score summed over sites: every
+    site contributes its own renewable terms (quality), and demand proximity
+    annual_demand_tons / (distance + 1) counts once per demand center, for
+    its nearest open site. A site loaded beyond capacity_tpd only earns the
+    served fraction of its demand proximity.
+    """
+
+    def __init__(self, candidates: Sequence[Tuple[float, float]], groups: Sequence[Any],
+                 quality: Sequence[float], demand_points: Sequence[Tuple[float, float]],
+                 demand_tons: Sequence[float], coverage_km: float, proximity_scale: float,
+                 anchors: Optional[Dict[Any, Tuple[float, float]]] = None,
+                 anchor_km: Optional[Sequence[float]] = None):
+        self.candidates = list(candidates)
+        self.groups = list(groups)
+        self.quality = list(quality)
+        self.demand_points = list(demand_points)
+        self.demand_tons = [float(tons or 0) for tons in demand_tons]
+        self.demand_tpd = [tons / 365 for tons in self.demand_tons]
+        self.coverage_km = coverage_km
+        self.proximity_scale = proximity_scale
+        start = time.perf_counter()
+        self.rows = self._build_rows(anchors, anchor_km)
+        self.build_seconds = time.perf_counter() - start
+        self.matrix_entries = sum(len(indices) for indices, _ in self.rows)
+
+    def _build_rows(self, anchors, anchor_km) -> List[Tuple[array, array]]:
+        """Row j: the demand centers candidate j covers and their scaled proximity.
+
+        Rows are stored as flat arrays to keep million-entry matrices small.
+        When candidates cluster around anchor points (group -> (lat, lon),
+        with each candidate's distance to its anchor) the demand table is
+        searched once per anchor with the radius widened by the farthest
+        candidate, and each candidate then scans only that subset.
+        """
+        table = DistanceTable(self.demand_points)
+        members: Dict[Any, List[int]] = {}
+        for j, group in enumerate(self.groups):
+            members.setdefault(group if anchors is not None else j, []).append(j)
+
+        rows: List[Optional[Tuple[array, array]]] = [None] * len(self.candidates)
+        a_limit = math.sin(min(math.pi, self.coverage_km / EARTH_RADIUS_KM) / 2) ** 2
+        diameter = 2 * EARTH_RADIUS_KM
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        for key, candidates in members.items():
+            if anchors is None:
+                nearby = [i for i, _ in table.within(*self.candidates[key], self.coverage_km)]
+            else:
+                reach = self.coverage_km + max(anchor_km[j] for j in candidates)
+                nearby = [i for i, _ in table.within(*anchors[key], reach)]
+            subset = [(i, math.radians(self.demand_points[i][0]), math.radians(self.demand_points[i][1]),
+                       math.cos(math.radians(self.demand_points[i][0])),
+                       self.demand_tons[i] * self.proximity_scale) for i in nearby]
+            for j in candidates:
+                lat, lon = self.candidates[j]
+                phi, lam = math.radians(lat), math.radians(lon)
+                cos_phi = math.cos(phi)
+                indices, proximity = array('i'), array('d')
+                for i, p_lat, p_lon, p_cos, weight in subset:
+                    half_dlat = sin((p_lat - phi) / 2)
+                    half_dlon = sin((p_lon - lam) / 2)
+                    a = half_dlat * half_dlat + cos_phi * p_cos * half_dlon * half_dlon
+                    if a <= a_limit:
+                        indices.append(i)
+                        proximity.append(weight / (diameter * asin(sqrt(a if a < 1.0 else 1.0)) + 1))
+                rows[j] = (indices, proximity)
+        return rows
+
+    def _earned(self, value: float, load: float, capacity: Optional[float]) -> float:
+        if capacity is None or load <= capacity:
+            return value
+        return value * capacity / load
+
+    def _gain(self, state: _Assignment, j: int, capacity: Optional[float]) -> float:
+        """Objective change from opening candidate j, in O(len(row j))"""
+        value = load = 0.0
+        lost: Dict[int, List[float]] = {}
+        best, site = state.best, state.site
+        for i, proximity in zip(*self.rows[j]):
+            if proximity > best[i]:
+                value += proximity
+                load += self.demand_tpd[i]
+                k = site[i]
+                if k >= 0:
+                    moved = lost.setdefault(k, [0.0, 0.0])
+                    moved[0] += best[i]
+                    moved[1] += self.demand_tpd[i]
+        gain = self.quality[j] + self._earned(value, load, capacity)
+        for k, (moved_value, moved_load) in lost.items():
+            gain += (self._earned(state.value[k] - moved_value, state.load[k] - moved_load, capacity)
+                     - self._earned(state.value[k], state.load[k], capacity))
+        return gain
+
+    def _open(self, state: _Assignment, j: int) -> None:
+        state.open.append(j)
+        state.value[j] = state.load[j] = 0.0
+        for i, proximity in zip(*self.rows[j]):
+            if proximity > state.best[i]:
+                k = state.site[i]
+                if k >= 0:
+                    state.value[k] -= state.best[i]
+                    state.load[k] -= self.demand_tpd[i]
+                state.best[i] = proximity
+                state.site[i] = j
+                state.value[j] += proximity
+                state.load[j] += self.demand_tpd[i]
+
+    def _build(self, sites: Sequence[int]) -> _Assignment:
+        state = _Assignment(len(self.demand_tons))
+        for j in sites:
+            self._open(state, j)
+        return state
+
+    def objective(self, state: _Assignment, capacity: Optional[float]) -> float:
+        return sum(self.quality[j] + self._earned(state.value[j], state.load[j], capacity)
+                   for j in state.open)
+
+    def _place(self, state: _Assignment, num_sites: int, capacity: Optional[float],
+               used_groups: Optional[set]) -> None:
+        """Lazy greedy: open the best candidate until num_sites are open or none is left.
+
+        With used_groups, at most one site is opened per group and the set is updated.
+        """
+        # Max-heap of (possibly stale) gains
+        heap = [(-self._gain(state, j, capacity), j) for j in range(len(self.candidates))
+                if j not in state.open]
+        heapq.heapify(heap)
+        while heap and len(state.open) < num_sites:
+            _, j = heapq.heappop(heap)
+            if used_groups is not None and self.groups[j] in used_groups:
+                continue
+            gain = self._gain(state, j, capacity)
+            if heap and gain < -heap[0][0]:
+                heapq.heappush(heap, (-gain, j))
+                continue
+            self._open(state, j)
+            if used_groups is not None:
+                used_groups.add(self.groups[j])
+
+    def solve(self, num_sites: int, capacity: Optional[float] = None,
+              time_budget: float = DEFAULT_TIME_BUDGET_SECONDS) -> Dict[str, Any]:
+        """Greedy placement, then best-improvement swaps within the time budget.
+
+        The greedy phase always completes so a full portfolio is returned;
+        it is lazy (stale gains are only recomputed when they reach the top
+        of the queue), which is exact while capacity never binds. Sites go
+        near distinct groups first; only when there are fewer groups than
+        sites does a group get a second one.
+        """
+        start = time.perf_counter()
+        deadline = start + time_budget
+        state = _Assignment(len(self.demand_tons))
+        self._place(state, num_sites, capacity, set())
+        shared_groups = len(state.open) < num_sites
+        if shared_groups:
+            self._place(state, num_sites, capacity, None)
+        greedy_objective = self.objective(state, capacity)
+
+        # Local search: replace one open site with a closed candidate while that helps
+        swaps = 0
+        stopped_by_budget = False
+        improved = True
+        while improved and not stopped_by_budget:
+            improved = False
+            for s in list(state.open):
+                if time.perf_counter() > deadline:
+                    stopped_by_budget = True
+                    break
+                base = self._build([j for j in state.open if j != s])
+                base_groups = {self.groups[j] for j in base.open}
+                current = self.objective(state, capacity)
+                base_objective = self.objective(base, capacity)
+                best_j, best_objective = None, current
+                for j in range(len(self.candidates)):
+                    if j & 1023 == 0 and time.perf_counter() > deadline:
+                        stopped_by_budget = True
+                        break
+                    if j in state.open or (not shared_groups and self.groups[j] in base_groups):
+                        continue
+                    candidate_objective = base_objective + self._gain(base, j, capacity)
+                    if candidate_objective > best_objective * (1 + 1e-9) + 1e-12:
+                        best_j, best_objective = j, candidate_objective
+                if stopped_by_budget:
+                    break
+                if best_j is not None:
+                    self._open(base, best_j)
+                    state = base
+                    swaps += 1
+                    improved = True
+
+        return {
+            "sites": list(state.open),
+            "shared_groups": shared_groups,
+            "state": state,
+            "objective": self.objective(state, capacity),
+            "greedy_objective": greedy_objective,
+            "swaps": swaps,
+            "stopped_by_time_budget": stopped_by_budget,
+            "seconds": time.perf_counter() - start
+        }
+
+    def site_summary(self, state: _Assignment, j: int, capacity: Optional[float]) -> Dict[str, Any]:
+        """Demand served by one open site"""
+        lat, lon = self.candidates[j]
+        assigned = [(i, haversine_km(lat, lon, *self.demand_points[i]))
+                    for i in self.rows[j][0] if state.site[i] == j]
+        load = sum(self.demand_tpd[i] for i, _ in assigned)
+        served = load if capacity is None else min(load, capacity)
+        summary = {
+            "assigned_demand_centers": len(assigned),
+            "assigned_demand_tpd": round(load, 2),
+            "served_demand_tpd": round(served, 2),
+            "mean_distance_to_demand_km": round(sum(km for _, km in assigned) / len(assigned), 2)
+                                          if assigned else None
+        }
+        if capacity is not None:
+            summary["utilization"] = round(served / capacity, 4) if capacity > 0 else None
+        return summary
+
+    def coverage(self, state: _Assignment, capacity: Optional[float]) -> Dict[str, Any]:
+        """How much of the demand the portfolio covers and can actually serve"""
+        total = sum(self.demand_tpd)
+        covered = [i for i, k in enumerate(state.site) if k >= 0]
+        covered_tpd = sum(self.demand_tpd[i] for i in covered)
+        served = sum(min(state.load[j], capacity) if capacity is not None else state.load[j]
+                     for j in state.open)
+        return {
+            "demand_centers": len(self.demand_tpd),
+            "covered_demand_centers": len(covered),
+            "total_demand_tpd": round(total, 2),
+            "covered_demand_tpd": round(covered_tpd, 2),
+            "served_demand_tpd": round(served, 2),
+            "served_fraction": round(served / total, 4) if total > 0 else 0.0
+        }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Opt-in sampling profiler for diagnosing slow optimize requests in production
+Samples Python stacks from a background thread and returns collapsed stacks
+(flamegraph.pl / speedscope compatible) plus per-function totals
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# module:function labels whose totals are always reported, even when never sampled:
+# the optimizer loop, its demand scoring and its storage, market and route lookups
+FOCUS_FUNCTIONS = ("app:optimize_location", "influence:evaluate", "siting:nearest_batch",
+                   "transport:nearest_batch")
+
+MAX_SAMPLED_REQUESTS = 100
+MAX_WINDOW_SECONDS = 60
+# A request-mode session that has not seen its requests by then ends with what it sampled
+MAX_REQUEST_SESSION_SECONDS = 600
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling session is already running"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Statistical profiler that only runs while a session is active.
+
+    When idle there is no sampler thread and the request hook is a single
+    attribute check, so leaving it compiled in costs nothing.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.active = False
+        self._lock = threading.Lock()
+        self._targets = set()  # Thread idents being sampled in request mode
+        self._all_threads = False
+        self._remaining = 0
+        self._stacks = Counter()
+        self._samples = 0
+        self._started = 0.0
+        self._mode = None
+        self._sampler = None
+        self._timer = None
+        self.last_profile: Optional[Dict[str, Any]] = None
+
+    def _begin(self, mode: str) -> None:
+        if self.active:
+            raise ProfilerBusy("A profiling session is already running")
+        self._stacks = Counter()
+        self._samples = 0
+        self._targets = set()
+        self._started = time.perf_counter()
+        self._mode = mode
+        self.active = True
+        self._sampler = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._sampler.start()
+
+    def _finish(self) -> None:
+        self.active = False
+        # Wait for the sampler's last pass before reading its stacks, so they do
+        # not change underneath us and a new session never overlaps this one
+        self._sampler.join()
+        self._sampler = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._all_threads = False
+        self.last_profile = self._build_profile(time.perf_counter() - self._started)
+
+    def profile_requests(self, count: int, timeout: float = MAX_REQUEST_SESSION_SECONDS) -> int:
+        """Sample the next `count` tracked requests; the profile is kept in last_profile.
+
+        The session ends after timeout seconds even if fewer requests arrived.
+        """
+        count = max(1, min(int(count), MAX_SAMPLED_REQUESTS))
+        timeout = max(1.0, min(float(timeout), MAX_REQUEST_SESSION_SECONDS))
+        with self._lock:
+            self._begin(f"requests:{count}")
+            self._remaining = count
+            self._timer = threading.Timer(timeout, self._expire, args=(self._started,))
+            self._timer.daemon = True
+            self._timer.start()
+        return count
+
+    def cancel(self) -> bool:
+        """End the running session early, keeping what it sampled; False if none was running"""
+        with self._lock:
+            if not self.active:
+                return False
+            self._finish()
+        return True
+
+    def _expire(self, started: float) -> None:
+        with self._lock:
+            # Only the session this timer was armed for; a newer one keeps running
+            if self.active and self._started == started:
+                self._finish()
+
+    def profile_window(self, seconds: float) -> Dict[str, Any]:
+        """Sample every thread for a time window and return the profile"""
+        seconds = max(0.1, min(float(seconds), MAX_WINDOW_SECONDS))
+        with self._lock:
+            self._begin(f"window:{seconds}s")
+            self._all_threads = True
+        time.sleep(seconds)
+        with self._lock:
+            if self.active:
+                self._finish()
+        return self.last_profile
+
+    @contextmanager
+    def track_request(self):
+        """Mark the current thread as profiled while a request-mode session is running"""
+        if not self.active or self._all_threads:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            if not self.active or self._remaining <= 0:
+                tracked = False
+            else:
+                tracked = True
+                self._remaining -= 1
+                self._targets.add(ident)
+        try:
+            yield
+        finally:
+            if tracked:
+                with self._lock:
+                    self._targets.discard(ident)
+                    if self._remaining <= 0 and not self._targets and self.active:
+                        self._finish()
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while self.active:
+            frames = sys._current_frames()
+            if self._all_threads:
+                targets = [ident for ident in frames if ident != own_ident]
+            else:
+                targets = list(self._targets)
+            for ident in targets:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+                self._samples += 1
+            time.sleep(self.interval)
+
+    def _build_profile(self, elapsed: float) -> Dict[str, Any]:
+        inclusive = Counter()
+        exclusive = Counter()
+        for stack, count in self._stacks.items():
+            frames = stack.split(";")
+            exclusive[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+
+        def totals(label: str) -> Dict[str, float]:
+            return {
+                "self_samples": exclusive[label],
+                "total_samples": inclusive[label],
+                "self_seconds": round(exclusive[label] * self.interval, 4),
+                "total_seconds": round(inclusive[label] * self.interval, 4)
+            }
+
+        functions = {label: totals(label) for label, _ in exclusive.most_common(25)}
+        for label in FOCUS_FUNCTIONS:
+            functions[label] = totals(label)
+
+        return {
+            "mode": self._mode,
+            "interval_seconds": self.interval,
+            "elapsed_seconds": round(elapsed, 4),
+            "samples": self._samples,
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()),
+            "functions": functions
+        }
+
+
+PROFILER = SamplingProfiler()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Capacity and demand projections over commission dates and growth rates
+For every year in the horizon: active renewable capacity, production supply,
+storage and demand per region, built once per dataset version from
+cumulative sums over records bucketed by the year they come online
+"""
+
+from datetime import datetime
+from itertools import accumulate
+from typing import Any, Dict, List, Optional
+
+from enrichment import normalize
+
+# Years projected past the base year
+HORIZON_YEARS = 30
+
+# Years after the base year a facility in each status is assumed to come online
+# at the earliest; statuses missing here (mothballed, cancelled) never contribute
+STATUS_LEAD_YEARS = {'operational': 0, 'under_construction': 1, 'planned': 3, 'proposed': 5}
+
+# category -> the capacity it adds to a region once online
+PROJECTED_MEASURES = {
+    'renewable_energy': 'capacity_mw',
+    'hydrogen_production': 'capacity_tpd',
+    'storage_facilities': 'working_capacity_tons'
+}
+
+# Series key used for the sum over all regions
+GLOBAL_KEY = 'global'
+
+
+def base_year(data: Dict[str, Any]) -> int:
+    """The year the data describes: when it was generated, or this year"""
+    created = (data.get('metadata') or {}).get('created_date')
+    try:
+        return datetime.fromisoformat(str(created)).year
+    except ValueError:
+        return datetime.now().year
+
+
+def commission_year(record: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int(str(record.get('commission_date'))[:4])
+    except ValueError:
+        return None
+
+
+def growth_factor(record: Dict[str, Any]) -> float:
+    """Yearly demand multiplier of a demand center; shrinking demand bottoms out at zero"""
+    return max(0.0, 1 + float(record.get('demand_growth_rate_percent') or 0) / 100)
+
+
+def projected_demand(record: Dict[str, Any], years: int) -> float:
+    """Annual demand of a center the given number of years after the base year"""
+    growth = growth_factor(record)
+    return float(record.get('annual_demand_tons') or 0) * growth ** years if growth > 0 else 0.0
+
+
+def online_year(record: Dict[str, Any], base: int) -> Optional[int]:
+    """First year a facility counts as active, or None if it never does.
+
+    Operational facilities are active from their commission year (or
+    always, without one); anything still being built or planned comes
+    online at its commission year or its status lead time, whichever is later.
+    """
+    lead = STATUS_LEAD_YEARS.get(record.get('status'))
+    if lead is None:
+        return None
+    year = commission_year(record)
+    if lead == 0:
+        return year if year is not None else 0
+    return max(year if year is not None else base, base + lead)
+
+
+class Projection:
+    """Per-region, per-year series for one dataset version.
+
+    Each facility is added to its region's bucket for the year it comes
+    online, and a running sum over the buckets gives the active capacity in
+    every year at once. Demand grows geometrically from the base year at
+    each center's demand_growth_rate_percent; every center's whole series is
+    accumulated in a single pass, so no year ever re-scans the records.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.base_year = base_year(data)
+        self.online = {category: [online_year(record, self.base_year) for record in data.get(category, [])]
+                       for category in PROJECTED_MEASURES}
+        commissioned = [year for years in self.online.values() for year in years if year]
+        self.first_year = min(commissioned + [self.base_year])
+        self.last_year = self.base_year + HORIZON_YEARS
+        self.years = list(range(self.first_year, self.last_year + 1))
+        horizon = len(self.years)
+
+        # region -> measure -> value per year
+        self.series: Dict[str, Dict[str, List[float]]] = {}
+
+        def buckets(region):
+            return self.series.setdefault(region, {category: [0.0] * horizon
+                                                   for category in [*PROJECTED_MEASURES, 'demand_centers']})
+
+        for category, measure in PROJECTED_MEASURES.items():
+            for record, year in zip(data.get(category, []), self.online[category]):
+                if year is None:
+                    continue
+                amount = float(record.get(measure) or 0)
+                start = max(0, year - self.first_year)
+                if start < horizon:
+                    buckets(normalize(record.get('region')))[category][start] += amount
+                    buckets(GLOBAL_KEY)[category][start] += amount
+        for region_series in self.series.values():
+            for category in PROJECTED_MEASURES:
+                region_series[category] = list(accumulate(region_series[category]))
+
+        offset = self.first_year - self.base_year
+        for record in data.get('demand_centers', []):
+            growth = growth_factor(record)
+            tons = float(record.get('annual_demand_tons') or 0)
+            if growth == 0 or tons == 0:
+                continue
+            regional = buckets(normalize(record.get('region')))['demand_centers']
+            overall = buckets(GLOBAL_KEY)['demand_centers']
+            value = projected_demand(record, offset)
+            for i in range(horizon):
+                regional[i] += value
+                overall[i] += value
+                value *= growth
+
+    def index(self, year: int) -> int:
+        if not self.first_year <= year <= self.last_year:
+            raise ValueError(f"year must be between {self.first_year} and {self.last_year}")
+        return year - self.first_year
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None,
+                region: Optional[str] = None) -> Dict[str, Any]:
+        """Year-by-year series between start and end inclusive, per region unless one is given"""
+        start = self.base_year if start is None else start
+        end = self.last_year if end is None else end
+        lo, hi = self.index(start), self.index(end) + 1
+        regions = [region or GLOBAL_KEY] if region else sorted(self.series)
+        return {
+            "base_year": self.base_year,
+            "years": self.years[lo:hi],
+            "regions": {
+                key: {category: [round(value, 2) for value in values[lo:hi]]
+                      for category, values in self.series.get(key, {}).items()}
+                for key in regions
+            }
+        }
+
+    def projected_data(self, data: Dict[str, Any], year: int) -> Dict[str, Any]:
+        """The dataset as it would look in year: only facilities online by then, all
+        marked operational, and every demand center at its projected demand"""
+        self.index(year)
+        projected = {}
+        for category, records in data.items():
+            if category in self.online:
+                projected[category] = [dict(record, status='operational')
+                                       for record, online in zip(records, self.online[category])
+                                       if online is not None and online <= year]
+            elif category == 'demand_centers':
+                projected[category] = [
+                    dict(record, annual_demand_tons=round(projected_demand(record, year - self.base_year), 2))
+                    for record in records
+                ]
+            else:
+                projected[category] = records
+        return projected
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the Green Hydrogen Infrastructure Dashboard
+Runs the ASGI application under uvicorn with several worker processes
+
+Usage: python serve.py [--host 0.0.0.0] [--port 8000] [--workers N]
+
+Each worker process holds its own copy of the dataset. With more than one
+worker the data file watcher is switched on (HYDROGEN_WATCH_INTERVAL, default
+5 seconds) so that regenerating the file reloads every worker; the admin
+reload endpoint only reloads the worker that happens to serve it. Dataset
+versions are content digests, so clients syncing against workers that hold
+different data get a full reload rather than a patch from the wrong history.
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+
+def default_workers():
+    """WEB_CONCURRENCY if set, otherwise one worker per CPU (optimizations are CPU-bound)"""
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    return os.cpu_count() or 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the hydrogen dashboard over ASGI")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8000')))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--backlog", type=int, default=4096,
+                        help="pending connections the socket will queue")
+    parser.add_argument("--keep-alive", type=int, default=30,
+                        help="seconds to hold idle keep-alive connections open")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        os.environ.setdefault('HYDROGEN_WATCH_INTERVAL', '5')
+
+    uvicorn.run(
+        "asgi:application",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        proxy_headers=True
+    )
+
+
+if __name__ == "__main__":
+    main()
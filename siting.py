@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Optional siting terms derived from existing infrastructure
+Scores candidate sites by their access to operational hydrogen storage and
+by how much of the nearby demand existing production already supplies
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from enrichment import normalize
+from spatial import SphericalKDTree, anchor_groups, haversine_km
+
+DEFAULT_STORAGE_REACH_KM = 300.0
+DEFAULT_MARKET_KM = 300.0
+
+# Storage facilities considered per candidate; beyond a handful the term saturates anyway
+STORAGE_NEIGHBOURS = 5
+
+# Share of nameplate capacity counted as supply; planned and mothballed plants supply nothing
+SUPPLY_STATUS_WEIGHTS = {'operational': 1.0, 'under_construction': 0.5}
+
+
+def nearest_batch(tree: SphericalKDTree, points: Sequence[Tuple[float, float]],
+                  sites: Sequence[Tuple[float, float]], reach_km: float,
+                  k: Optional[int]) -> List[List[Tuple[int, float]]]:
+    """k_nearest(max_km=reach_km) for a cluster of sites, or every neighbour in
+    reach nearest first when k is None, with one index query per group of sites.
+
+    One radius query around each anchor_groups() anchor finds every
+    candidate point for its group, and the sites only rank that short list.
+    """
+    results: List[List[Tuple[int, float]]] = [[] for _ in sites]
+    for (anchor_lat, anchor_lon), group, spread in anchor_groups(sites, reach_km):
+        nearby = [index for index, _ in tree.within(anchor_lat, anchor_lon, reach_km + spread)]
+        for position in group:
+            lat, lon = sites[position]
+            distances = ((index, haversine_km(lat, lon, *points[index])) for index in nearby)
+            in_reach = sorted((neighbour for neighbour in distances if neighbour[1] <= reach_km),
+                              key=lambda neighbour: neighbour[1])
+            results[position] = in_reach if k is None else in_reach[:k]
+    return results
+
+
+class StorageIndex:
+    """Spatial index over operational storage with spare working capacity.
+
+    A candidate's storage access is the sum over nearby facilities of
+    working_capacity_tons / largest working capacity, each discounted
+    linearly to zero at the reach distance, capped at 1.
+    """
+
+    def __init__(self, records: Sequence[Dict[str, Any]]):
+        self.facilities = [record for record in records
+                           if record.get('status') == 'operational' and (record.get('working_capacity_tons') or 0) > 0]
+        self._points = [(record['latitude'], record['longitude']) for record in self.facilities]
+        self._spare = [float(record['working_capacity_tons']) for record in self.facilities]
+        self._largest = max(self._spare, default=0.0)
+        self._tree = SphericalKDTree(self._points)
+
+    def __len__(self) -> int:
+        return len(self.facilities)
+
+    def _score(self, neighbours: List[Tuple[int, float]], reach_km: float) -> float:
+        access = sum((self._spare[index] / self._largest * (1 - km / reach_km) for index, km in neighbours), 0.0)
+        return min(1.0, access)
+
+    def access_batch(self, points: Sequence[Tuple[float, float]], reach_km: float = DEFAULT_STORAGE_REACH_KM
+                     ) -> List[Tuple[float, Optional[Tuple[int, float]]]]:
+        """(storage access in [0, 1], (facility index, km) of the nearest or None) for
+        each of a cluster of points, with batched index queries"""
+        if not points or not self.facilities or reach_km <= 0:
+            return [(0.0, None)] * len(points)
+        return [(self._score(neighbours, reach_km), (neighbours[0] if neighbours else None))
+                for neighbours in nearest_batch(self._tree, self._points, points, reach_km, STORAGE_NEIGHBOURS)]
+
+
+class SupplyIndex:
+    """Existing production capacity netted against demand around a site.
+
+    A candidate's market is every producer and demand center within
+    market_km, each weighted linearly down to zero at that distance.
+    Saturation is local supply / local demand in tonnes per day, capped at
+    1: a site next to plants that already cover the demand around it scores
+    1, one with no competing supply scores 0. A market with no demand in
+    reach falls back to the balance of the site's whole region, from
+    aggregates precomputed per region.
+    """
+
+    def __init__(self, production: Sequence[Dict[str, Any]], demand: Sequence[Dict[str, Any]]):
+        self.producers = [record for record in production
+                          if SUPPLY_STATUS_WEIGHTS.get(record.get('status'), 0) > 0
+                          and (record.get('capacity_tpd') or 0) > 0]
+        self._producer_points = [(record['latitude'], record['longitude']) for record in self.producers]
+        self._supply = [float(record['capacity_tpd']) * SUPPLY_STATUS_WEIGHTS[record['status']]
+                        for record in self.producers]
+        self._producer_tree = SphericalKDTree(self._producer_points)
+        self._demand_points = [(record['latitude'], record['longitude']) for record in demand]
+        self._demand = [float(record.get('annual_demand_tons') or 0) / 365 for record in demand]
+        self._demand_tree = SphericalKDTree(self._demand_points)
+
+        # region -> [supply tpd, demand tpd]
+        self.regions: Dict[str, List[float]] = {}
+        for record, supply in zip(self.producers, self._supply):
+            self.regions.setdefault(normalize(record.get('region')), [0.0, 0.0])[0] += supply
+        for record, tpd in zip(demand, self._demand):
+            self.regions.setdefault(normalize(record.get('region')), [0.0, 0.0])[1] += tpd
+
+    @staticmethod
+    def _local(neighbours: List[Tuple[int, float]], amounts: List[float], market_km: float) -> float:
+        return sum((amounts[index] * (1 - km / market_km) for index, km in neighbours), 0.0)
+
+    def _balance(self, producers: List[Tuple[int, float]], demand: List[Tuple[int, float]],
+                 region: Any, market_km: float) -> Dict[str, Any]:
+        supply_tpd = self._local(producers, self._supply, market_km)
+        demand_tpd = self._local(demand, self._demand, market_km)
+        regional_supply, regional_demand = self.regions.get(normalize(region), (0.0, 0.0))
+        if demand_tpd > 0:
+            saturation = min(1.0, supply_tpd / demand_tpd)
+        elif regional_demand > 0:
+            saturation = min(1.0, regional_supply / regional_demand)
+        else:
+            saturation = 1.0 if supply_tpd > 0 else 0.0
+        return {
+            "saturation": saturation,
+            "local_supply_tpd": supply_tpd,
+            "local_demand_tpd": demand_tpd,
+            "regional_supply_tpd": regional_supply,
+            "regional_demand_tpd": regional_demand,
+            "competitors": producers
+        }
+
+    def balance_batch(self, points: Sequence[Tuple[float, float]], region: Any = None,
+                      market_km: float = DEFAULT_MARKET_KM) -> List[Dict[str, Any]]:
+        """Supply/demand balance of each market around a cluster of points in one region,
+        with batched index queries; competitors are (producer index, km)"""
+        if not points or market_km <= 0:
+            return [self._balance([], [], region, 1.0) for _ in points]
+        producers = (nearest_batch(self._producer_tree, self._producer_points, points, market_km, None)
+                     if self.producers else [[] for _ in points])
+        demand = (nearest_batch(self._demand_tree, self._demand_points, points, market_km, None)
+                  if self._demand_points else [[] for _ in points])
+        return [self._balance(site_producers, site_demand, region, market_km)
+                for site_producers, site_demand in zip(producers, demand)]
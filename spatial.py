@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Spatial indexing helpers shared by the data generator and the dashboard
+Nearest-neighbour lookups and batched distance queries over latitude/longitude
+points on a sphere
+"""
+
+import bisect
+import math
+import heapq
+from typing import Iterator, List, Tuple, Sequence, Optional
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points using the Haversine formula"""
+    dLat = math.radians(lat2 - lat1)
+    dLon = math.radians(lon2 - lon1)
+    a = (math.sin(dLat/2) * math.sin(dLat/2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dLon/2) * math.sin(dLon/2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    return EARTH_RADIUS_KM * c
+
+
+def latitude_gap_km(lat1: float, lat2: float) -> float:
+    """Distance along a meridian between two latitudes.
+
+    Never more than the great-circle distance between any two points at
+    those latitudes, so it can reject pairs without touching a trig function.
+    """
+    return EARTH_RADIUS_KM * math.radians(abs(lat1 - lat2))
+
+
+def to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    """Convert latitude/longitude in degrees to a point on the unit sphere"""
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def anchor_groups(points: Sequence[Tuple[float, float]],
+                  reach_km: float) -> Iterator[Tuple[Tuple[float, float], List[int], float]]:
+    """Split points into groups of (anchor, positions, spread) for batched queries.
+
+    Each group holds the points within reach_km of its anchor, the first
+    point not yet grouped, and spread is the farthest of them from it.
+    Anything within reach of a member is within reach + spread of the
+    anchor, so one query there serves the whole group, and no query
+    reaches further than twice the reach however widely the points lie.
+    """
+    pending = list(range(len(points)))
+    while pending:
+        anchor = points[pending[0]]
+        offsets = [(position, haversine_km(anchor[0], anchor[1], *points[position])) for position in pending]
+        # The anchor always joins its own group, whatever the reach
+        group = [(position, km) for position, km in offsets if km <= reach_km or position == pending[0]]
+        pending = [position for position, km in offsets if not (km <= reach_km or position == pending[0])]
+        yield anchor, [position for position, _ in group], max(km for _, km in group)
+
+
+def chord_to_km(chord: float) -> float:
+    """Convert a straight-line unit-sphere chord length to great-circle km"""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km: float) -> float:
+    """Convert a great-circle distance in km to a unit-sphere chord length"""
+    angle = min(math.pi, km / EARTH_RADIUS_KM)
+    return 2 * math.sin(angle / 2)
+
+
+class SphericalKDTree:
+    """KD-tree over unit-sphere coordinates.
+
+    Chord length on the unit sphere is monotonic in great-circle distance, so
+    nearest neighbours in 3D are exact nearest neighbours on the globe and the
+    tree never has to deal with the antimeridian or the poles. Construction is
+    O(n log^2 n) and each query is O(log n) on well-spread data.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        self._coords = [to_unit_vector(lat, lon) for lat, lon in points]
+        self._order = list(range(len(self._coords)))
+        self._axes = [0] * len(self._coords)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._coords)
+
+    def _build(self) -> None:
+        coords = self._coords
+        order = self._order
+        stack = [(0, len(order))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= 1:
+                continue
+            # Split on the axis with the widest spread in this slice
+            segment = order[lo:hi]
+            spreads = []
+            for axis in range(3):
+                values = [coords[i][axis] for i in segment]
+                spreads.append(max(values) - min(values))
+            axis = spreads.index(max(spreads))
+            segment.sort(key=lambda i: coords[i][axis])
+            order[lo:hi] = segment
+            mid = (lo + hi) >> 1
+            self._axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+    def _search(self, lo: int, hi: int, q: Tuple[float, float, float],
+                k: int, bound_sq: float, heap: list) -> None:
+        if lo >= hi:
+            return
+        mid = (lo + hi) >> 1
+        idx = self._order[mid]
+        p = self._coords[idx]
+        dx = q[0] - p[0]
+        dy = q[1] - p[1]
+        dz = q[2] - p[2]
+        d2 = dx * dx + dy * dy + dz * dz
+        if d2 <= bound_sq:
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, idx))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, idx))
+        axis = self._axes[mid]
+        diff = q[axis] - p[axis]
+        if diff < 0:
+            near, far = (lo, mid), (mid + 1, hi)
+        else:
+            near, far = (mid + 1, hi), (lo, mid)
+        self._search(near[0], near[1], q, k, bound_sq, heap)
+        limit = bound_sq if len(heap) < k else min(bound_sq, -heap[0][0])
+        if diff * diff <= limit:
+            self._search(far[0], far[1], q, k, bound_sq, heap)
+
+    def k_nearest(self, lat: float, lon: float, k: int = 1,
+                  max_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Return up to k (index, distance_km) pairs, nearest first"""
+        if k <= 0 or not self._coords:
+            return []
+        bound_sq = float('inf') if max_km is None else km_to_chord(max_km) ** 2
+        heap: list = []
+        self._search(0, len(self._order), to_unit_vector(lat, lon), k, bound_sq, heap)
+        return [(idx, chord_to_km(math.sqrt(-neg_d2)))
+                for neg_d2, idx in sorted(heap, reverse=True)]
+
+    def nearest(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Return the (index, distance_km) of the closest point, or (-1, inf)"""
+        result = self.k_nearest(lat, lon, 1)
+        return result[0] if result else (-1, float('inf'))
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Return every (index, distance_km) pair within radius_km, nearest first"""
+        return self.k_nearest(lat, lon, len(self._coords), max_km=radius_km)
+
+
+class DistanceTable:
+    """Points with precomputed radians and cos(lat) for batched distance queries.
+
+    Distances use the haversine form 2R*asin(sqrt(a)) with
+    a = sin^2(dlat/2) + cos(lat1)*cos(lat2)*sin^2(dlon/2), so each pair costs
+    two sines instead of four trig calls, two square roots and an atan2.
+
+    Radius queries are tiered and every tier is exact, so nothing inside the
+    radius is ever rejected:
+      1. a latitude band found by bisection over latitude-sorted points
+      2. the longitude half-width of the spherical cap's bounding box
+      3. comparing a against sin^2(r/2), which needs no sqrt or asin
+    Only survivors of all three get a distance computed.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        self._lats = [math.radians(lat) for lat, _ in points]
+        self._lons = [math.radians(lon) for _, lon in points]
+        self._cos_lats = [math.cos(lat) for lat in self._lats]
+        self._by_lat = sorted(range(len(self._lats)), key=self._lats.__getitem__)
+        self._sorted_lats = [self._lats[i] for i in self._by_lat]
+
+    def __len__(self) -> int:
+        return len(self._lats)
+
+    def distances(self, lat: float, lon: float) -> List[float]:
+        """Distance in km from (lat, lon) to every point, in input order"""
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        cos_phi = math.cos(phi)
+        sin = math.sin
+        asin = math.asin
+        sqrt = math.sqrt
+        diameter = 2 * EARTH_RADIUS_KM
+        result = []
+        for p_lat, p_lon, p_cos in zip(self._lats, self._lons, self._cos_lats):
+            half_dlat = sin((p_lat - phi) / 2)
+            half_dlon = sin((p_lon - lam) / 2)
+            a = half_dlat * half_dlat + cos_phi * p_cos * half_dlon * half_dlon
+            result.append(diameter * asin(sqrt(a if a < 1.0 else 1.0)))
+        return result
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Every (index, distance_km) pair within radius_km, in no particular order"""
+        angle = radius_km / EARTH_RADIUS_KM
+        if angle < 0:
+            return []
+        if angle >= math.pi:
+            return list(enumerate(self.distances(lat, lon)))
+
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        cos_phi = math.cos(phi)
+        lo = bisect.bisect_left(self._sorted_lats, phi - angle)
+        hi = bisect.bisect_right(self._sorted_lats, phi + angle)
+        if abs(phi) + angle < math.pi / 2:
+            lon_limit = math.asin(min(1.0, math.sin(angle) / cos_phi))
+        else:
+            lon_limit = math.pi  # The cap contains a pole
+        a_limit = math.sin(angle / 2) ** 2
+
+        sin = math.sin
+        two_pi = 2 * math.pi
+        lats, lons, cos_lats = self._lats, self._lons, self._cos_lats
+        survivors = []
+        for i in self._by_lat[lo:hi]:
+            dlon = abs(lons[i] - lam)
+            if dlon > math.pi:
+                dlon = two_pi - dlon
+            if dlon > lon_limit:
+                continue
+            half_dlat = sin((lats[i] - phi) / 2)
+            half_dlon = sin(dlon / 2)
+            a = half_dlat * half_dlat + cos_phi * cos_lats[i] * half_dlon * half_dlon
+            if a <= a_limit:
+                survivors.append((i, a))
+
+        diameter = 2 * EARTH_RADIUS_KM
+        return [(i, diameter * math.asin(math.sqrt(a if a < 1.0 else 1.0))) for i, a in survivors]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Cold-start instrumentation and lazy optional imports
+Records how long each startup phase of a worker takes, and keeps the heavy
+geospatial and plotting stacks out of the process until a feature needs them
+"""
+
+import importlib
+import sys
+import time
+from typing import Any, Dict, List
+
+from metrics import STARTUP_SECONDS
+
+# Optional dependencies that take tens to hundreds of milliseconds to import;
+# nothing on the path that serves the dashboard and its data may load them
+HEAVY_MODULES = ('pandas', 'geopandas', 'numpy', 'matplotlib', 'folium', 'shapely', 'pyproj', 'pyarrow')
+
+_started = time.perf_counter()
+_last_mark = _started
+_phases: Dict[str, float] = {}
+
+
+def mark(phase: str) -> float:
+    """Record the time since the previous mark (or since this module was imported) as phase"""
+    global _last_mark
+    now = time.perf_counter()
+    seconds = _phases[phase] = now - _last_mark
+    _last_mark = now
+    STARTUP_SECONDS.set(seconds, phase=phase)
+    return seconds
+
+
+def heavy_modules_loaded() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def report() -> Dict[str, Any]:
+    """Startup phases in milliseconds and which heavy modules have been imported so far"""
+    return {
+        "phases_ms": {phase: round(seconds * 1000, 2) for phase, seconds in _phases.items()},
+        "total_ms": round((_last_mark - _started) * 1000, 2),
+        "heavy_modules_loaded": heavy_modules_loaded()
+    }
+
+
+def optional_import(name: str, feature: str) -> Any:
+    """Import a heavy optional dependency on first use of the feature that needs it"""
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise ImportError(f"{feature} requires the optional dependency {name.split('.')[0]} "
+                          f"(pip install -r requirements.txt)") from e
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Dataset statistics computed once per loaded dataset
+Per-category counts, distinct values, numeric summaries and regional rollups
+"""
+
+import math
+from typing import Dict, Any, List
+
+# Fields that identify records rather than describe them
+IDENTIFIER_FIELDS = {"id", "name", "region_name", "commission_date", "nearby_renewable_source",
+                     "start_facility_id", "end_facility_id"}
+
+# Categorical fields with more distinct values than this only report the distinct count
+MAX_REPORTED_VALUES = 100
+
+PERCENTILES = (25, 50, 75, 90, 99)
+
+# The quantity each category contributes to regional rollups
+ROLLUP_MEASURES = {
+    "renewable_energy": "capacity_mw",
+    "hydrogen_production": "capacity_tpd",
+    "storage_facilities": "capacity_tons",
+    "transport_infrastructure": "capacity_tpd",
+    "demand_centers": "annual_demand_tons",
+    "environmental_constraints": "area_hectares",
+    "economic_data": "gdp_trillions_usd"
+}
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, math.ceil(percentile / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_numeric(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    summary = {
+        "count": len(values),
+        "min": values[0],
+        "max": values[-1],
+        "mean": round(sum(values) / len(values), 4)
+    }
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = _percentile(values, percentile)
+    return summary
+
+
+def summarize_category(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Single pass over a category collecting per-field values"""
+    numeric: Dict[str, List[float]] = {}
+    categorical: Dict[str, Dict[str, int]] = {}
+    for record in records:
+        for field, value in record.items():
+            if field in IDENTIFIER_FIELDS or value is None:
+                continue
+            if isinstance(value, bool):
+                value = str(value).lower()
+            if isinstance(value, (int, float)):
+                numeric.setdefault(field, []).append(value)
+            elif isinstance(value, str):
+                counts = categorical.setdefault(field, {})
+                counts[value] = counts.get(value, 0) + 1
+
+    fields = {}
+    for field, counts in categorical.items():
+        present = sum(counts.values())
+        entry = {"distinct": len(counts), "missing": len(records) - present}
+        if len(counts) <= MAX_REPORTED_VALUES:
+            entry["values"] = dict(sorted(counts.items()))
+        fields[field] = entry
+
+    return {
+        "count": len(records),
+        "categorical": fields,
+        "numeric": {field: summarize_numeric(values) for field, values in numeric.items()}
+    }
+
+
+def rollup(data: Dict[str, Any], key: str) -> Dict[str, Dict[str, Any]]:
+    """Per-region or per-country record counts and measure totals for every category"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for category, measure in ROLLUP_MEASURES.items():
+        for record in data.get(category, []):
+            group = record.get(key) or "Unknown"
+            entry = groups.setdefault(group, {}).setdefault(category, {"count": 0, measure: 0.0})
+            entry["count"] += 1
+            entry[measure] = round(entry[measure] + (record.get(measure) or 0), 2)
+    return dict(sorted(groups.items()))
+
+
+def compute_statistics(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compute every aggregate served by /api/stats"""
+    categories = {
+        category: summarize_category(records)
+        for category, records in data.items()
+        if category != "metadata" and isinstance(records, list)
+    }
+
+    # Regions offered in the optimizer dropdown
+    regions = set()
+    for category in ("renewable_energy", "hydrogen_production", "demand_centers"):
+        values = categories.get(category, {}).get("categorical", {}).get("region", {}).get("values", {})
+        regions.update(values)
+
+    return {
+        "categories": categories,
+        "regions": sorted(regions),
+        "by_region": rollup(data, "region"),
+        "by_country": rollup(data, "country"),
+        "total_records": sum(summary["count"] for summary in categories.values())
+    }
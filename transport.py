@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Transport route geometry and spatial index
+Routes are great-circle arcs between their vertices (start and end, or a
+path when a record has one); an R-tree over short sub-arcs answers
+point-to-route distance and bounding-box queries, and map polylines are
+precomputed at several levels of detail
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from spatial import EARTH_RADIUS_KM, anchor_groups, haversine_km, to_unit_vector
+
+# Routes are split into sub-arcs no longer than this for the index; shorter
+# arcs get tighter bounding boxes
+INDEX_SEGMENT_KM = 200.0
+
+# Entries per R-tree node
+NODE_CAPACITY = 16
+
+# Map zoom levels with a precomputed polyline; at its zoom each stays within
+# one 256px tile pixel of the true great-circle route. The last also serves
+# every closer zoom.
+LOD_ZOOMS = (2, 5, 8, 11)
+
+Box = Tuple[float, float, float, float]  # south, west, north, east in degrees
+Vector = Tuple[float, float, float]
+
+
+def route_vertices(route: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """The (lat, lon) vertices a route passes through"""
+    if route.get('path'):
+        return [(float(lat), float(lon)) for lat, lon in route['path']]
+    ends = (route.get('start_latitude'), route.get('start_longitude'),
+            route.get('end_latitude'), route.get('end_longitude'))
+    if any(value is None for value in ends):
+        return []
+    return [(ends[0], ends[1]), (ends[2], ends[3])]
+
+
+def _to_lat_lon(v: Vector) -> Tuple[float, float]:
+    return (math.degrees(math.asin(max(-1.0, min(1.0, v[2])))), math.degrees(math.atan2(v[1], v[0])))
+
+
+def arc_points(lat1: float, lon1: float, lat2: float, lon2: float, step_km: float) -> List[Tuple[float, float]]:
+    """Points evenly spaced along the great circle between two points, both ends included"""
+    pieces = max(1, math.ceil(haversine_km(lat1, lon1, lat2, lon2) / step_km))
+    if pieces == 1:
+        return [(lat1, lon1), (lat2, lon2)]
+    a, b = to_unit_vector(lat1, lon1), to_unit_vector(lat2, lon2)
+    omega = math.acos(max(-1.0, min(1.0, a[0] * b[0] + a[1] * b[1] + a[2] * b[2])))
+    sin_omega = math.sin(omega)
+    if sin_omega < 1e-12:  # Antipodal ends have no unique great circle
+        return [(lat1, lon1), (lat2, lon2)]
+    points = [(lat1, lon1)]
+    for step in range(1, pieces):
+        t = step / pieces
+        wa, wb = math.sin((1 - t) * omega) / sin_omega, math.sin(t * omega) / sin_omega
+        points.append(_to_lat_lon((wa * a[0] + wb * b[0], wa * a[1] + wb * b[1], wa * a[2] + wb * b[2])))
+    points.append((lat2, lon2))
+    return points
+
+
+def _cross(u: Vector, v: Vector) -> Vector:
+    return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+
+def _dot(u: Vector, v: Vector) -> float:
+    return u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+
+
+def _angle(u: Vector, v: Vector) -> float:
+    """Angle between unit vectors, from their chord"""
+    chord = math.sqrt((u[0] - v[0]) ** 2 + (u[1] - v[1]) ** 2 + (u[2] - v[2]) ** 2)
+    return 2 * math.asin(min(1.0, chord / 2))
+
+
+def arc_distance_km(p: Vector, a: Vector, b: Vector, normal: Optional[Vector]) -> float:
+    """Great-circle distance from p to the minor arc a-b; normal is the unit a x b, or None if a == b.
+
+    If p's projection onto the arc's plane falls between a and b the nearest
+    point is on the arc's interior and the distance is the cross-track angle;
+    otherwise it is the nearer endpoint.
+    """
+    if normal is not None:
+        s = _dot(p, normal)
+        c = (p[0] - s * normal[0], p[1] - s * normal[1], p[2] - s * normal[2])
+        if _dot(_cross(a, c), normal) >= 0 and _dot(_cross(c, b), normal) >= 0:
+            return EARTH_RADIUS_KM * math.asin(min(1.0, abs(s)))
+    return EARTH_RADIUS_KM * min(_angle(p, a), _angle(p, b))
+
+
+def _lon_boxes(south: float, west: float, north: float, east: float) -> List[Box]:
+    """A box whose longitudes may run past +-180, split at the antimeridian"""
+    if east - west >= 360:
+        return [(south, -180.0, north, 180.0)]
+    if west < -180:
+        return [(south, west + 360, north, 180.0), (south, -180.0, north, east)]
+    if east > 180:
+        return [(south, west, north, 180.0), (south, -180.0, north, east - 360)]
+    return [(south, west, north, east)]
+
+
+def cap_boxes(lat: float, lon: float, radius_km: float) -> List[Box]:
+    """Bounding boxes of everything within radius_km of a point"""
+    angle = radius_km / EARTH_RADIUS_KM
+    degrees = math.degrees(angle)
+    south, north = max(-90.0, lat - degrees), min(90.0, lat + degrees)
+    if abs(lat) + degrees >= 90:
+        return [(south, -180.0, north, 180.0)]  # The cap contains a pole
+    lon_limit = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(lat)))))
+    return _lon_boxes(south, lon - lon_limit, north, lon + lon_limit)
+
+
+def _arc_boxes(lat1: float, lon1: float, lat2: float, lon2: float) -> List[Box]:
+    """Bounding boxes of a short great-circle arc.
+
+    Every point of the arc is within half its length of an endpoint, so
+    padding the endpoints' box like cap_boxes does is a safe bound even
+    though the arc bulges poleward between them.
+    """
+    half_km = haversine_km(lat1, lon1, lat2, lon2) / 2
+    angle = half_km / EARTH_RADIUS_KM
+    pad = math.degrees(angle)
+    south, north = max(-90.0, min(lat1, lat2) - pad), min(90.0, max(lat1, lat2) + pad)
+    if max(abs(lat1), abs(lat2)) + pad >= 90:
+        return [(south, -180.0, north, 180.0)]
+    lon_pad = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(max(abs(lat1), abs(lat2)))))))
+    if lon2 - lon1 > 180:
+        lon2 -= 360
+    elif lon1 - lon2 > 180:
+        lon2 += 360
+    return _lon_boxes(south, min(lon1, lon2) - lon_pad, north, max(lon1, lon2) + lon_pad)
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _union(boxes: Sequence[Box]) -> Box:
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+
+class RTree:
+    """Static R-tree over boxes, bulk-loaded with Sort-Tile-Recursive packing.
+
+    Entries are sorted into vertical slabs by box center longitude, each slab
+    by center latitude, and cut into full nodes; the same packing is
+    repeated on the nodes until one root is left.
+    """
+
+    def __init__(self, entries: Sequence[Tuple[Box, int]]):
+        # Nodes are (box, children, leaf); a leaf's children are (box, payload) entries
+        level = [(box, payload) for box, payload in entries]
+        leaf = True
+        self._root = None
+        while level:
+            nodes = [(_union([box for box, _ in group]), group, leaf) for group in self._pack(level)]
+            leaf = False
+            if len(nodes) == 1:
+                self._root = nodes[0]
+                break
+            level = [(node[0], node) for node in nodes]
+
+    @staticmethod
+    def _pack(items: List[Tuple[Box, Any]]) -> List[List[Tuple[Box, Any]]]:
+        count = math.ceil(len(items) / NODE_CAPACITY)
+        slab_size = math.ceil(math.sqrt(count)) * NODE_CAPACITY
+        items = sorted(items, key=lambda item: item[0][1] + item[0][3])
+        groups = []
+        for start in range(0, len(items), slab_size):
+            slab = sorted(items[start:start + slab_size], key=lambda item: item[0][0] + item[0][2])
+            groups.extend(slab[i:i + NODE_CAPACITY] for i in range(0, len(slab), NODE_CAPACITY))
+        return groups
+
+    def search(self, boxes: Sequence[Box]) -> Set[int]:
+        """Payloads of every entry overlapping any of the boxes"""
+        found: Set[int] = set()
+        if self._root is None:
+            return found
+        stack = [self._root]
+        while stack:
+            _, children, leaf = stack.pop()
+            for box, child in children:
+                if any(_overlaps(box, query) for query in boxes):
+                    if leaf:
+                        found.add(child)
+                    else:
+                        stack.append(child)
+        return found
+
+
+class RouteIndex:
+    """Point-to-route distance and bounding-box queries over transport routes.
+
+    Routes are cut into sub-arcs of at most INDEX_SEGMENT_KM and their
+    bounding boxes go into an R-tree. A radius query fetches the sub-arcs
+    whose boxes overlap the query cap's boxes, drops those whose midpoint
+    is farther than the radius plus half their length (one dot product),
+    and measures the exact great-circle distance to the rest, so it never
+    misses a route in reach.
+    """
+
+    def __init__(self, routes: Sequence[Dict[str, Any]]):
+        self.routes = list(routes)
+        # segment -> (route index, a, b, unit normal of a x b or None, midpoint, half length in radians)
+        self._segments: List[Tuple[int, Vector, Vector, Optional[Vector], Vector, float]] = []
+        entries = []
+        for route_index, route in enumerate(self.routes):
+            vertices = route_vertices(route)
+            if len(vertices) == 1:
+                vertices = vertices * 2
+            for (lat1, lon1), (lat2, lon2) in zip(vertices, vertices[1:]):
+                points = arc_points(lat1, lon1, lat2, lon2, INDEX_SEGMENT_KM)
+                for p, q in zip(points, points[1:]):
+                    a, b = to_unit_vector(*p), to_unit_vector(*q)
+                    normal = _cross(a, b)
+                    length = math.sqrt(_dot(normal, normal))
+                    normal = (normal[0] / length, normal[1] / length, normal[2] / length) if length > 1e-12 else None
+                    mid = (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+                    mid_length = math.sqrt(_dot(mid, mid))
+                    mid = (mid[0] / mid_length, mid[1] / mid_length, mid[2] / mid_length) if mid_length > 1e-12 else a
+                    entries.extend((box, len(self._segments)) for box in _arc_boxes(*p, *q))
+                    self._segments.append((route_index, a, b, normal, mid, _angle(a, b) / 2))
+        self._tree = RTree(entries)
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def _screen(self, segments: Set[int], radius_km: float) -> List[Tuple[int, float]]:
+        """(segment, cosine limit): a point p can only be in reach if p . midpoint >= the limit"""
+        angle = radius_km / EARTH_RADIUS_KM
+        return [(segment, math.cos(angle + self._segments[segment][5])
+                 if angle + self._segments[segment][5] < math.pi else -1.0)
+                for segment in segments]
+
+    def _distances(self, p: Vector, screened: List[Tuple[int, float]], radius_km: float) -> Dict[int, float]:
+        best: Dict[int, float] = {}
+        for segment, limit in screened:
+            route_index, a, b, normal, mid, _ = self._segments[segment]
+            if p[0] * mid[0] + p[1] * mid[1] + p[2] * mid[2] < limit:
+                continue
+            km = arc_distance_km(p, a, b, normal)
+            if km <= radius_km and km < best.get(route_index, math.inf):
+                best[route_index] = km
+        return best
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Every (route index, distance_km) within radius_km, nearest first"""
+        screened = self._screen(self._tree.search(cap_boxes(lat, lon, radius_km)), radius_km)
+        distances = self._distances(to_unit_vector(lat, lon), screened, radius_km)
+        return sorted(distances.items(), key=lambda item: item[1])
+
+    def nearest(self, lat: float, lon: float, radius_km: float) -> Optional[Tuple[int, float]]:
+        """The closest (route index, distance_km) within radius_km, or None"""
+        found = self.within(lat, lon, radius_km)
+        return found[0] if found else None
+
+    def nearest_batch(self, points: Sequence[Tuple[float, float]],
+                      radius_km: float) -> List[Optional[Tuple[int, float]]]:
+        """nearest() for a cluster of points with one tree search per group of points.
+
+        A search around each anchor_groups() anchor covers its whole group,
+        and groups span at most radius_km, so spread-out points never make
+        a search screen segments far beyond their reach.
+        """
+        results: List[Optional[Tuple[int, float]]] = [None] * len(points)
+        for (anchor_lat, anchor_lon), group, spread in anchor_groups(points, radius_km):
+            screened = self._screen(self._tree.search(cap_boxes(anchor_lat, anchor_lon, radius_km + spread)),
+                                    radius_km)
+            for position in group:
+                distances = self._distances(to_unit_vector(*points[position]), screened, radius_km)
+                if distances:
+                    results[position] = min(distances.items(), key=lambda item: item[1])
+        return results
+
+    def in_box(self, south: float, west: float, north: float, east: float) -> List[int]:
+        """Indexes of routes that may cross the box, in input order; west > east wraps the antimeridian"""
+        boxes = _lon_boxes(south, west, north, east + 360 if west > east else east)
+        return sorted({self._segments[segment][0] for segment in self._tree.search(boxes)})
+
+
+def _mercator(v: Vector, reference_lon: float) -> Tuple[float, float]:
+    """Web Mercator (x, y) in degrees, with x unwrapped to within 180 of reference_lon"""
+    lat, lon = _to_lat_lon(v)
+    lon += 360 * round((reference_lon - lon) / 360)
+    lat = max(-85.05, min(85.05, lat))
+    return lon, math.degrees(math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)))
+
+
+def pixel_degrees(zoom: int) -> float:
+    """Width of one 256px tile pixel at a zoom level, in degrees of longitude"""
+    return 360 / (256 * 2 ** zoom)
+
+
+def _segment_offset(point: Tuple[float, float], start: Tuple[float, float], end: Tuple[float, float]) -> float:
+    (px, py), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    t = 0.0 if length_sq == 0 else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+    return math.hypot(px - x1 - t * dx, py - y1 - t * dy)
+
+
+def densify(vertices: Sequence[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    """Map polyline (lat, lon) following great circles between the vertices.
+
+    Each arc is bisected until its midpoint lies within tolerance of the
+    straight Mercator line the map would draw, so long or high-latitude arcs
+    get more points and short ones none. Longitudes are unwrapped so lines
+    crossing the antimeridian stay continuous.
+    """
+    if not vertices:
+        return []
+    start = vertices[0]
+    points = [(start[1], _mercator(to_unit_vector(*start), start[1])[1])]
+    for (lat1, lon1), (lat2, lon2) in zip(vertices, vertices[1:]):
+        a = to_unit_vector(lat1, lon1)
+        stack = [(a, to_unit_vector(lat2, lon2), 0)]
+        while stack:
+            a, b, depth = stack.pop()
+            reference = points[-1][0]
+            end = _mercator(b, reference)
+            m = (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+            norm = math.sqrt(_dot(m, m))
+            if depth < 16 and norm > 1e-12:
+                m = (m[0] / norm, m[1] / norm, m[2] / norm)
+                if _segment_offset(_mercator(m, reference), points[-1], end) > tolerance:
+                    stack.append((m, b, depth + 1))
+                    stack.append((a, m, depth + 1))
+                    continue
+            points.append(end)
+    return [(_latitude(y), x) for x, y in points]
+
+
+def _latitude(mercator_y: float) -> float:
+    return math.degrees(2 * math.atan(math.exp(math.radians(mercator_y))) - math.pi / 2)
+
+
+def simplify(points: List[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    """Douglas-Peucker on the Web Mercator plane, where the map draws straight lines"""
+    if len(points) <= 2:
+        return list(points)
+    xy = [_mercator(to_unit_vector(lat, lon), lon) for lat, lon in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_index = -1.0, None
+        for i in range(first + 1, last):
+            offset = _segment_offset(xy[i], xy[first], xy[last])
+            if offset > worst:
+                worst, worst_index = offset, i
+        if worst_index is not None and worst > tolerance:
+            keep[worst_index] = True
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+class RouteGeometry:
+    """Map polylines for every route at each LOD_ZOOMS level, built on first use of the level.
+
+    Routes are densified along their great circles to the level's pixel
+    tolerance; routes with a recorded path are then simplified at that
+    tolerance too, shedding vertices the map could not show.
+    """
+
+    def __init__(self, routes: Sequence[Dict[str, Any]]):
+        self._vertices = [route_vertices(route) for route in routes]
+        self._levels: Dict[int, List[List[Tuple[float, float]]]] = {}
+
+    def level(self, level: int) -> List[List[Tuple[float, float]]]:
+        """(lat, lon) polylines of every route at one level"""
+        paths = self._levels.get(level)
+        if paths is None:
+            tolerance = pixel_degrees(LOD_ZOOMS[level])
+            paths = self._levels[level] = [simplify(densify(route, tolerance), tolerance) if len(route) > 2
+                                           else densify(route, tolerance) for route in self._vertices]
+        return paths
+
+    @staticmethod
+    def level_for_zoom(zoom: Optional[int]) -> int:
+        """Coarsest level still accurate to a pixel at zoom; full detail when zoom is None"""
+        if zoom is not None:
+            for level, level_zoom in enumerate(LOD_ZOOMS):
+                if zoom <= level_zoom:
+                    return level
+        return len(LOD_ZOOMS) - 1
+
+    def path(self, route_index: int, level: int) -> List[List[float]]:
+        return [[round(lat, 5), round(lon, 5)] for lat, lon in self.level(level)[route_index]]